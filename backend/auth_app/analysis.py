@@ -0,0 +1,239 @@
+# auth_app/analysis.py
+
+"""Analyse map-reduce des documents financiers.
+
+Chaque document est découpé en segments selon un budget de tokens (tiktoken),
+chaque segment est résumé séparément (map, en parallèle via auth_app/llm.py),
+puis les résumés sont regroupés par document et comparés pour produire
+convergences et divergences (reduce).
+Les résumés de segments sont mis en cache en base (AnalysisCacheEntry).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from . import llm, metrics
+from .models import AnalysisCacheEntry
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_PROMPT = "Tu es un expert comptable. Réponds uniquement en JSON valide selon le format demandé."
+
+# À incrémenter à chaque modification des prompts : invalide le cache des résumés
+PROMPT_VERSION = 1
+
+# Le prompt map ne dépend que du texte du segment, ce qui permet de mettre son résumé en cache
+MAP_PROMPT = (
+    "Voici un extrait d'un document financier.\n"
+    "Résume-le en identifiant :\n"
+    "- Les chiffres clés (CA, bénéfices, pertes, ratios)\n"
+    "- Les anomalies ou points d'attention\n"
+    "- Les tendances financières\n\n"
+    'Réponds avec un JSON de la forme {{"summary": "résumé"}}.\n\n'
+    "Extrait :\n{text}"
+)
+
+COMBINE_PROMPT = (
+    "Voici des résumés partiels consécutifs du document financier n°{document}.\n"
+    "Fusionne-les en un seul résumé en conservant tous les chiffres clés et points d'attention.\n"
+    'Réponds avec un JSON de la forme {{"summary": "résumé"}}.\n\n'
+    "Résumés partiels :\n{text}"
+)
+
+REDUCE_PROMPT = (
+    "Tu es un expert comptable qui analyse des documents financiers. "
+    "Voici le résumé de chacun des {document_count} documents.\n\n"
+    "IMPORTANT: Ta réponse doit être un JSON valide avec cette structure exacte:\n"
+    "{{\n"
+    '  "summaries": ["résumé du document 1", "résumé du document 2", ...],\n'
+    '  "convergences": ["point commun 1", "point commun 2", ...],\n'
+    '  "divergences": ["différence 1", "différence 2", ...]\n'
+    "}}\n\n"
+    "Donne un résumé par document, dans l'ordre, puis compare les documents pour identifier "
+    "convergences et divergences.\n\n"
+    "Résumés :\n{text}"
+)
+
+@lru_cache(maxsize=None)
+def get_encoding():
+    # Import ici : seul le worker d'analyse a besoin de tiktoken, pas le démarrage de l'API
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(settings.OPENAI_MODEL)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(text):
+    return len(get_encoding().encode(text))
+
+
+def split_into_segments(text, max_tokens):
+    # Découpage par tokens : la totalité du texte est couverte, sans troncature
+    tokens = get_encoding().encode(text)
+    return [get_encoding().decode(tokens[i:i + max_tokens]) for i in range(0, len(tokens), max_tokens)]
+
+
+async def chat_json(prompt, max_tokens):
+    response = await llm.get_gateway().chat_completion(
+        model=settings.OPENAI_MODEL,
+        messages=[
+            {"role": "system", "content": SYSTEM_PROMPT},
+            {"role": "user", "content": prompt}
+        ],
+        max_tokens=max_tokens,
+        temperature=0.2,
+        response_format={"type": "json_object"}
+    )
+    return json.loads(response.choices[0].message.content)
+
+
+async def summarize_segment(text):
+    prompt = MAP_PROMPT.format(text=text)
+    return str((await chat_json(prompt, settings.OPENAI_MAP_MAX_TOKENS)).get("summary", "")).strip()
+
+
+async def combine_summaries(summaries, document):
+    text = "\n\n".join(summaries)
+    prompt = COMBINE_PROMPT.format(document=document, text=text)
+    return str((await chat_json(prompt, settings.OPENAI_MAP_MAX_TOKENS)).get("summary", "")).strip()
+
+
+def cache_key(text):
+    content = f"{settings.OPENAI_MODEL}\n{PROMPT_VERSION}\n{text}"
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def summarize_segments(segments):
+    # Les segments déjà résumés (même modèle, mêmes prompts, même texte) ne rappellent pas l'API
+    keys = [cache_key(text) for text in segments]
+    cached = dict(AnalysisCacheEntry.objects.filter(key__in=set(keys)).values_list('key', 'summary'))
+    if cached:
+        AnalysisCacheEntry.objects.filter(key__in=cached.keys()).update(
+            hit_count=F('hit_count') + 1,
+            last_used_at=timezone.now()
+        )
+
+    missing = {}
+    for key, text in zip(keys, segments):
+        if key not in cached:
+            missing[key] = text
+
+    hits = len(keys) - sum(1 for key in keys if key in missing)
+    metrics.incr('analysis_cache.hits', hits)
+    metrics.incr('analysis_cache.misses', len(keys) - hits)
+    logger.info(f"Cache d'analyse: {hits} segment(s) réutilisé(s), {len(missing)} à résumer")
+
+    # Map : résumés des segments en parallèle, concurrence bornée par la passerelle
+    async def summarize_all():
+        return await asyncio.gather(*(summarize_segment(text) for text in missing.values()), return_exceptions=True)
+
+    results = dict(zip(missing, llm.get_gateway().run(summarize_all())))
+    summaries = {key: result for key, result in results.items() if not isinstance(result, BaseException)}
+
+    # Les résumés obtenus sont mis en cache même si un autre segment a échoué :
+    # la nouvelle tentative du job ne repaiera que les segments manquants
+    AnalysisCacheEntry.objects.bulk_create([
+        AnalysisCacheEntry(key=key, model=settings.OPENAI_MODEL, prompt_version=PROMPT_VERSION, summary=summary)
+        for key, summary in summaries.items() if summary
+    ], ignore_conflicts=True)
+
+    errors = [result for result in results.values() if isinstance(result, BaseException)]
+    if errors:
+        raise errors[0]
+
+    cached.update(summaries)
+    return [cached[key] for key in keys]
+
+
+def evict_cache():
+    # TTL puis taille maximale, les entrées les moins récemment utilisées partent en premier
+    expired = timezone.now() - timedelta(days=settings.ANALYSIS_CACHE_TTL_DAYS)
+    deleted, _ = AnalysisCacheEntry.objects.filter(last_used_at__lt=expired).delete()
+
+    overflow = AnalysisCacheEntry.objects.count() - settings.ANALYSIS_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        ids = list(AnalysisCacheEntry.objects.order_by('last_used_at', 'id').values_list('id', flat=True)[:overflow])
+        deleted += AnalysisCacheEntry.objects.filter(id__in=ids).delete()[0]
+
+    if deleted:
+        metrics.incr('analysis_cache.evictions', deleted)
+    return deleted
+
+
+def reduce_budget():
+    # Tokens disponibles pour les résumés dans le prompt de réduction
+    overhead = count_tokens(SYSTEM_PROMPT) + count_tokens(REDUCE_PROMPT.format(document_count=0, text=""))
+    return settings.OPENAI_CONTEXT_TOKENS - settings.OPENAI_REDUCE_MAX_TOKENS - overhead
+
+
+def format_document_summaries(document_summaries):
+    return "\n\n".join(
+        f"=== DOCUMENT {index} ===\n" + "\n".join(summaries)
+        for index, summaries in enumerate(document_summaries, 1)
+    )
+
+
+def collapse(document_summaries, budget):
+    # Fusionne les résumés partiels du document le plus long jusqu'à tenir dans le budget
+    document_summaries = [list(summaries) for summaries in document_summaries]
+    while count_tokens(format_document_summaries(document_summaries)) > budget:
+        # Seuls les documents qui ont encore plusieurs résumés peuvent être réduits
+        fusionnables = [i for i, summaries in enumerate(document_summaries) if len(summaries) > 1]
+        if not fusionnables:
+            raise ValueError("Les résumés dépassent le budget de tokens du modèle")
+        index = max(fusionnables, key=lambda i: count_tokens("\n".join(document_summaries[i])))
+        summaries = document_summaries[index]
+        # Fusion par paires pour garder chaque appel sous la taille d'un segment
+        async def merge_pairs():
+            return await asyncio.gather(*(
+                combine_summaries(summaries[i:i + 2], index + 1)
+                for i in range(0, len(summaries) - 1, 2)
+            ))
+
+        merged = llm.get_gateway().run(merge_pairs())
+        if len(summaries) % 2:
+            merged.append(summaries[-1])
+        document_summaries[index] = merged
+    return document_summaries
+
+
+def analyze_documents(texts):
+    segment_tokens = settings.OPENAI_SEGMENT_TOKENS
+    jobs = []  # (document, texte du segment)
+    for document, text in enumerate(texts, 1):
+        segments = split_into_segments(text, segment_tokens)
+        logger.info(f"Document {document}: {len(segments)} segments de {segment_tokens} tokens max")
+        for segment_text in segments:
+            jobs.append((document, segment_text))
+
+    segment_summaries = summarize_segments([segment_text for _, segment_text in jobs])
+
+    document_summaries = [[] for _ in texts]
+    for (document, _), summary in zip(jobs, segment_summaries):
+        if summary:
+            document_summaries[document - 1].append(summary)
+
+    # Reduce : comparaison de tous les documents dans un seul prompt, sous le budget de tokens
+    document_summaries = collapse(document_summaries, reduce_budget())
+    prompt = REDUCE_PROMPT.format(document_count=len(texts), text=format_document_summaries(document_summaries))
+    analysis = llm.get_gateway().run(chat_json(prompt, settings.OPENAI_REDUCE_MAX_TOKENS))
+
+    for key in ('summaries', 'convergences', 'divergences'):
+        if key not in analysis:
+            analysis[key] = []
+        elif not isinstance(analysis[key], list):
+            analysis[key] = [str(analysis[key])]
+
+    logger.info(f"Analyse réussie: {len(jobs)} segments, {len(analysis['summaries'])} résumés, "
+                f"{len(analysis['convergences'])} convergences, "
+                f"{len(analysis['divergences'])} divergences")
+    return analysis
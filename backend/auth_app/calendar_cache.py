@@ -0,0 +1,42 @@
+# auth_app/calendar_cache.py
+
+"""Cache des réponses calendrier, par centre ou par contrôleur.
+
+La clé d'une réponse contient la version (auth_app/versions.py, table PlanningVersion)
+de chacune des portées dont elle dépend : liste des contrôleurs d'un centre,
+plannings d'un contrôleur, congés d'un centre, jours fériés. Une modification
+incrémente la version en base : les anciennes réponses ne sont plus jamais lues et
+expirent d'elles-mêmes, sans parcourir les clés.
+
+Les versions sont lues en base à chaque requête, comme pour l'ETag : le corps servi
+correspond toujours à l'ETag annoncé, même avec un cache propre à chaque processus
+(locmem) et une modification faite par un autre processus ou une commande.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.response import Response
+
+from . import metrics
+
+
+def cached_response(request, etat, build_response):
+    """Renvoie la réponse en cache pour cette URL et ces versions, sinon build_response().
+
+    etat : liste de (scope, object_id, version), cf. versions.current_many()."""
+    if settings.CALENDAR_CACHE_TIMEOUT <= 0:
+        return build_response()
+    versions = ",".join(f"{scope}:{object_id}:{version}" for scope, object_id, version in etat)
+    key = "calendar:" + hashlib.sha1(f"{request.get_full_path()}|{versions}".encode()).hexdigest()
+
+    data = cache.get(key)
+    if data is not None:
+        metrics.incr('calendar_cache.hits')
+        return Response(data)
+    metrics.incr('calendar_cache.misses')
+    response = build_response()
+    if response.status_code == 200:
+        cache.set(key, response.data, settings.CALENDAR_CACHE_TIMEOUT)
+    return response
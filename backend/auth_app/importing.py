@@ -0,0 +1,363 @@
+# auth_app/importing.py
+
+"""Socle commun des commandes d'import (manage.py import_*).
+
+Les tables de correspondance (centres par nom, clés déjà présentes) sont chargées
+une seule fois en mémoire. L'import est un pipeline à trois étages reliés par des
+files bornées : lecture du fichier (CSV, CSV gzip ou XLSX), validation et
+construction des instances, puis écriture en base par paquets, chaque paquet avec
+un seul bulk_create dans sa propre transaction. Les lignes invalides sont écrites
+dans un fichier de rejets et un point de reprise est enregistré après chaque paquet.
+"""
+
+import csv
+import gzip
+import json
+import os
+import queue
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+
+FIN = object()
+UPDATE_BATCH_SIZE = 100
+
+
+def read_csv(path):
+    # (numéro de ligne, dictionnaire) ; la ligne 1 est l'en-tête
+    opener = gzip.open if path.endswith('.gz') else open
+    with opener(path, 'rt', newline='', encoding='utf-8-sig') as f:
+        yield from enumerate(csv.DictReader(f), start=2)
+
+
+def cell_text(value):
+    # Les cellules Excel sont typées : on les ramène au texte attendu par les importeurs
+    if value is None:
+        return ''
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.date().isoformat() if value.time() == datetime.min.time() else value.isoformat()
+    if isinstance(value, date):
+        return value.isoformat()
+    return str(value)
+
+
+def read_xlsx(path):
+    # Première feuille, lue en streaming (read_only) ; la première ligne contient les en-têtes
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        lignes = workbook.worksheets[0].iter_rows(values_only=True)
+        entetes = [cell_text(v).strip() for v in next(lignes, ())]
+        for numero, valeurs in enumerate(lignes, start=2):
+            if any(v is not None for v in valeurs):
+                yield numero, dict(zip(entetes, (cell_text(v) for v in valeurs)))
+    finally:
+        workbook.close()
+
+
+def read_rows(path):
+    return read_xlsx(path) if path.endswith('.xlsx') else read_csv(path)
+
+
+def chunks(iterable, size):
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class ImportStats:
+    def __init__(self):
+        self.lignes = 0
+        self.crees = 0
+        self.mises_a_jour = 0
+        self.inchangees = 0
+        self.ignorees = 0
+        self.erreurs = 0
+        self.debut = time.perf_counter()
+
+    @property
+    def duree(self):
+        return time.perf_counter() - self.debut
+
+    @property
+    def debit(self):
+        return self.lignes / self.duree if self.duree else 0
+
+
+class Checkpoint:
+    # Dernière ligne écrite en base, pour reprendre un import interrompu
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+        self.ligne = 0
+
+    def load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        if data['source'] != self.source:
+            raise CommandError(f"Le point de reprise {self.path} concerne un autre fichier : {data['source']}")
+        self.ligne = data['ligne']
+
+    def save(self, ligne):
+        self.ligne = ligne
+        tmp = f"{self.path}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'ligne': ligne}, f)
+        os.replace(tmp, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class RejectFile:
+    # Lignes invalides avec leur numéro et l'erreur, créé à la première ligne rejetée
+    def __init__(self, path, append=False):
+        self.path = path
+        self.mode = 'a' if append and os.path.exists(path) else 'w'
+        self.file = None
+        self.writer = None
+
+    def write(self, numero, row, error):
+        if self.writer is None:
+            self.file = open(self.path, self.mode, newline='', encoding='utf-8')
+            self.writer = csv.writer(self.file)
+            if self.mode == 'w':
+                self.writer.writerow(['ligne', 'erreur', *row.keys()])
+        self.writer.writerow([numero, str(error), *row.values()])
+
+    def close(self):
+        if self.file:
+            self.file.close()
+
+
+def put(q, item, stop):
+    # put bloquant qui abandonne si l'étage suivant s'est arrêté
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def get(q, stop):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return FIN
+
+
+class Importer:
+    """À spécialiser par modèle : preload() charge les correspondances, build(row)
+    retourne l'instance à créer (ou None pour ignorer la ligne) et lève ValueError ou
+    KeyError si la ligne est invalide, key(obj) donne la clé naturelle de dédoublonnage.
+
+    En mode upsert, preload() remplit existants avec clé -> (pk, valeurs de update_fields) :
+    les lignes déjà présentes dont une valeur change sont mises à jour par bulk_update.
+    """
+
+    model = None
+    update_fields = ()
+
+    def __init__(self, batch_size=1000, on_error=None, queue_size=4, upsert=False):
+        self.batch_size = batch_size
+        self.on_error = on_error
+        self.queue_size = queue_size
+        self.upsert = upsert
+        self.existants = {} if upsert else set()
+
+    def preload(self):
+        pass
+
+    def build(self, row):
+        raise NotImplementedError
+
+    def key(self, obj):
+        return None
+
+    def prepare(self, chunk, stats):
+        # Lignes du paquet -> instances à insérer, instances à mettre à jour et rejets
+        objs, maj, rejets = [], [], []
+        for numero, row in chunk:
+            stats.lignes += 1
+            try:
+                obj = self.build(row)
+            except (KeyError, ValueError) as e:
+                stats.erreurs += 1
+                rejets.append((numero, row, e))
+                continue
+            if obj is None:
+                stats.ignorees += 1
+                continue
+            key = self.key(obj)
+            if key is None:
+                objs.append(obj)
+            elif not self.upsert:
+                if key in self.existants:
+                    stats.ignorees += 1
+                    continue
+                self.existants.add(key)
+                objs.append(obj)
+            else:
+                valeurs = tuple(getattr(obj, field) for field in self.update_fields)
+                pk, existantes = self.existants.get(key, (None, None))
+                # pk None : clé déjà vue plus haut dans le fichier, seule la première ligne compte
+                if key in self.existants and pk is None:
+                    stats.ignorees += 1
+                elif key not in self.existants:
+                    objs.append(obj)
+                elif valeurs == existantes:
+                    stats.inchangees += 1
+                else:
+                    obj.pk = pk
+                    champs = tuple(f for f, v, e in zip(self.update_fields, valeurs, existantes) if v != e)
+                    maj.append((obj, champs))
+                self.existants[key] = (None, valeurs)
+        return objs, maj, rejets
+
+    def write(self, objs, maj, stats):
+        # Mises à jour regroupées par colonnes modifiées : bulk_update génère un CASE par
+        # colonne et par lot, coûteux sur de gros lots, d'où des lots plus petits
+        par_champs = defaultdict(list)
+        for obj, champs in maj:
+            par_champs[champs].append(obj)
+        with transaction.atomic():
+            inseres = 0
+            if objs:
+                # ignore_conflicts ne dit pas quelles lignes ont été insérées (doublon écrit par un
+                # autre processus depuis preload) : on compte les clés créées par ce lot
+                dernier = self.model.objects.aggregate(dernier=Max('pk'))['dernier'] or 0
+                self.model.objects.bulk_create(objs, batch_size=self.batch_size, ignore_conflicts=True)
+                inseres = self.model.objects.filter(pk__gt=dernier).count()
+            for champs, objets in par_champs.items():
+                self.model.objects.bulk_update(objets, champs, batch_size=UPDATE_BATCH_SIZE)
+        stats.crees += inseres
+        stats.ignorees += len(objs) - inseres
+        stats.mises_a_jour += len(maj)
+
+    def run(self, rows, checkpoint=None, rejects=None):
+        stats = ImportStats()
+        self.preload()
+        reprise = checkpoint.ligne if checkpoint else 0
+        lues, validees = queue.Queue(self.queue_size), queue.Queue(self.queue_size)
+        stop = threading.Event()
+
+        # Étage 1 : lecture et découpage en paquets
+        def lire():
+            try:
+                for chunk in chunks((r for r in rows if r[0] > reprise), self.batch_size):
+                    if not put(lues, chunk, stop):
+                        return
+            except Exception as e:
+                put(lues, e, stop)
+            finally:
+                put(lues, FIN, stop)
+
+        # Étage 2 : validation et construction des instances (sans accès à la base)
+        def valider():
+            try:
+                while (chunk := get(lues, stop)) is not FIN:
+                    if isinstance(chunk, Exception):
+                        put(validees, chunk, stop)
+                        return
+                    objs, maj, rejets = self.prepare(chunk, stats)
+                    if not put(validees, (objs, maj, rejets, chunk[-1][0]), stop):
+                        return
+            except Exception as e:
+                put(validees, e, stop)
+            finally:
+                put(validees, FIN, stop)
+
+        etages = [threading.Thread(target=lire, name='import-lecture', daemon=True),
+                  threading.Thread(target=valider, name='import-validation', daemon=True)]
+        for etage in etages:
+            etage.start()
+
+        # Étage 3 : écriture en base, dans ce thread (connexion Django du thread principal)
+        try:
+            while (item := validees.get()) is not FIN:
+                if isinstance(item, Exception):
+                    raise item
+                objs, maj, rejets, derniere_ligne = item
+                self.write(objs, maj, stats)
+                for numero, row, error in rejets:
+                    if rejects:
+                        rejects.write(numero, row, error)
+                    if self.on_error:
+                        self.on_error(numero, row, error)
+                if checkpoint:
+                    checkpoint.save(derniere_ligne)
+        finally:
+            stop.set()
+            for etage in etages:
+                etage.join()
+        return stats
+
+
+class ImportCommand(BaseCommand):
+    importer_class = None
+    label = "ligne(s)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', type=str, help="Chemin vers le fichier (.csv, .csv.gz ou .xlsx)")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Nombre de lignes par transaction")
+        parser.add_argument('--queue-size', type=int, default=4, help="Paquets en attente entre deux étages")
+        parser.add_argument('--rejects', type=str, default=None,
+                            help="Fichier CSV des lignes rejetées (par défaut <fichier>.rejets.csv)")
+        parser.add_argument('--resume', action='store_true',
+                            help="Reprend après la dernière ligne enregistrée (<fichier>.checkpoint)")
+        if self.importer_class.update_fields:
+            parser.add_argument('--upsert', action='store_true',
+                                help="Met à jour les lignes existantes (" + ", ".join(self.importer_class.update_fields) + ")")
+
+    def handle(self, *args, **options):
+        self.verbosity = options['verbosity']
+        source = options['csv_file']
+        checkpoint = Checkpoint(f"{source}.checkpoint", source)
+        if options['resume']:
+            checkpoint.load()
+            if checkpoint.ligne:
+                self.stdout.write(f"Reprise après la ligne {checkpoint.ligne}.")
+        else:
+            checkpoint.clear()
+        rejects = RejectFile(options['rejects'] or f"{source}.rejets.csv", append=options['resume'])
+
+        importer = self.importer_class(
+            batch_size=options['batch_size'], on_error=self.report_error, queue_size=options['queue_size'],
+            upsert=options.get('upsert', False)
+        )
+        try:
+            stats = importer.run(read_rows(source), checkpoint, rejects)
+        finally:
+            rejects.close()
+        checkpoint.clear()
+
+        if stats.ignorees:
+            self.stdout.write(f"{stats.ignorees} ligne(s) ignorée(s) (déjà présentes ou référence inconnue).")
+        if stats.erreurs:
+            self.stdout.write(self.style.WARNING(f"{stats.erreurs} ligne(s) en erreur, voir {rejects.path}."))
+        if importer.upsert:
+            self.stdout.write(f"{stats.crees} inséré(s), {stats.mises_a_jour} mis à jour, {stats.inchangees} inchangé(s).")
+        self.stdout.write(self.style.SUCCESS(
+            f"{stats.crees + stats.mises_a_jour} {self.label} importé(s) avec succès "
+            f"({stats.lignes} lignes en {stats.duree:.2f} s, {stats.debit:.0f} lignes/s)."
+        ))
+
+    def report_error(self, numero, row, error):
+        if self.verbosity >= 2:
+            self.stdout.write(self.style.WARNING(f"Ligne {numero} rejetée : {error!r}"))
@@ -0,0 +1,124 @@
+# auth_app/llm.py
+
+"""Passerelle asyncio vers l'API OpenAI.
+
+Un seul client AsyncOpenAI par processus, exécuté sur une boucle d'événements dédiée
+(thread "llm-gateway") pour pouvoir être appelé depuis du code Django synchrone.
+Tous les appels passent par un sémaphore global, un token bucket de débit, un timeout
+par appel et des nouvelles tentatives avec backoff exponentiel et jitter sur 429/5xx.
+"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+
+import openai
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+def is_retryable(error):
+    if isinstance(error, (openai.APITimeoutError, openai.APIConnectionError, asyncio.TimeoutError)):
+        return True
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code == 429 or error.status_code >= 500
+    return False
+
+
+def retry_delay(attempt, error):
+    # Retry-After fourni par l'API en cas de 429, sinon backoff exponentiel "full jitter"
+    response = getattr(error, 'response', None)
+    retry_after = response.headers.get('retry-after') if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), settings.OPENAI_BACKOFF_MAX)
+        except ValueError:
+            pass
+    return random.uniform(0, min(settings.OPENAI_BACKOFF_MAX, settings.OPENAI_BACKOFF_BASE * (2 ** attempt)))
+
+
+class LLMGateway:
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='llm-gateway', daemon=True)
+        self.thread.start()
+        self.client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            base_url=settings.OPENAI_BASE_URL,
+            timeout=settings.OPENAI_TIMEOUT,
+            max_retries=0  # les nouvelles tentatives sont gérées ici
+        )
+        self.semaphore = asyncio.Semaphore(settings.OPENAI_MAX_CONCURRENCY)
+        self.bucket = TokenBucket(settings.OPENAI_RATE_LIMIT_RPS, settings.OPENAI_RATE_LIMIT_BURST)
+
+    def run(self, coro):
+        # Point d'entrée synchrone : exécute la coroutine sur la boucle de la passerelle
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    async def chat_completion(self, **kwargs):
+        for attempt in range(settings.OPENAI_MAX_RETRIES + 1):
+            await self.bucket.acquire()
+            try:
+                async with self.semaphore:
+                    return await asyncio.wait_for(self.client.chat.completions.create(**kwargs), settings.OPENAI_TIMEOUT)
+            except Exception as e:
+                if not is_retryable(e) or attempt == settings.OPENAI_MAX_RETRIES:
+                    raise
+                delay = retry_delay(attempt, e)
+                logger.warning(f"Appel OpenAI échoué ({type(e).__name__}), nouvelle tentative {attempt + 1} dans {delay:.2f}s")
+                await asyncio.sleep(delay)
+
+    def close(self):
+        async def shutdown():
+            await self.client.close()
+        try:
+            asyncio.run_coroutine_threadsafe(shutdown(), self.loop).result(timeout=5)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join(timeout=5)
+
+
+_lock = threading.Lock()
+_gateway = None
+
+
+def get_gateway():
+    global _gateway
+    if _gateway is None:
+        with _lock:
+            if _gateway is None:
+                _gateway = LLMGateway()
+    return _gateway
+
+
+def reset_gateway():
+    global _gateway
+    with _lock:
+        gateway, _gateway = _gateway, None
+    if gateway is not None:
+        gateway.close()
@@ -0,0 +1,156 @@
+import random
+import time
+from collections import defaultdict
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from auth_app.availability import Disponibilites
+from auth_app.planning import Probleme, get_moteur, indicateurs, planifier, planifier_par_centre
+
+
+def generer_donnees(nb_employeurs, nb_controleurs, nb_centres, rng, annee=2025):
+    # Données synthétiques : jours ouvrés de l'année, quelques fériés, ~10 jours de congés par contrôleur
+    debut, fin = date(annee, 1, 1), date(annee, 12, 31)
+    jours = [debut + timedelta(days=i) for i in range((fin - debut).days + 1)]
+    feries = set(rng.sample([j for j in jours if j.weekday() < 5], 10))
+    jours_valides = [j for j in jours if j.weekday() < 5 and j not in feries]
+
+    controleurs = [(c, c % nb_centres) for c in range(nb_controleurs)]
+    employeurs = [(100000 + e, e % nb_centres, rng.randint(0, 100)) for e in range(nb_employeurs)]
+    conges = {c: set(rng.sample(jours_valides, 10)) for c, _ in controleurs}
+    return jours_valides, employeurs, controleurs, conges
+
+
+def planifier_reference(jours_valides, employeurs, controleurs, conges, rng):
+    # Ancienne boucle de la commande planification, conservée pour comparaison
+    jours_valides = set(jours_valides)
+    semaines = list(dict.fromkeys(j.isocalendar()[:2] for j in sorted(jours_valides)))
+    rng.shuffle(semaines)
+    controleurs_par_centre = defaultdict(list)
+    for c, centre in controleurs:
+        controleurs_par_centre[centre].append(c)
+    planifs_par_controleur = defaultdict(int)
+    semaines_occupees = defaultdict(set)
+    jours_attribution = defaultdict(int)
+
+    employeurs = sorted(employeurs, key=lambda e: -e[2])
+    groupes = []
+    chunk_size = max(1, len(employeurs) // len(semaines))
+    for i in range(0, len(employeurs), chunk_size):
+        groupe = employeurs[i:i + chunk_size]
+        rng.shuffle(groupe)
+        groupes.append(groupe)
+    rng.shuffle(groupes)
+
+    affectations = []
+    for employeur_id, centre, _ in [e for g in groupes for e in g]:
+        controleurs_du_centre = sorted(controleurs_par_centre.get(centre, []), key=lambda c: planifs_par_controleur[c])
+        semaines_melangees = semaines.copy()
+        rng.shuffle(semaines_melangees)
+        planifie = False
+        for year, week in semaines_melangees:
+            if planifie:
+                break
+            jours_de_la_semaine = [d for d in jours_valides if d.isocalendar()[:2] == (year, week)]
+            jours_de_la_semaine.sort(key=lambda d: jours_attribution[d.weekday()])
+            for c in controleurs_du_centre:
+                if (year, week) in semaines_occupees[c]:
+                    continue
+                for jour in jours_de_la_semaine:
+                    if jour in conges[c]:
+                        continue
+                    affectations.append((c, employeur_id, jour))
+                    semaines_occupees[c].add((year, week))
+                    planifs_par_controleur[c] += 1
+                    jours_attribution[jour.weekday()] += 1
+                    planifie = True
+                    break
+                if planifie:
+                    break
+    return affectations
+
+
+class Command(BaseCommand):
+    help = "Mesure le temps de la planification sur des centres, contrôleurs et employeurs synthétiques"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tailles', type=str, default='1000,5000,20000', help="Nombres d'employeurs, séparés par des virgules")
+        parser.add_argument('--employeurs-par-controleur', type=int, default=40)
+        parser.add_argument('--controleurs-par-centre', type=int, default=10)
+        parser.add_argument('--reference', action='store_true', help="Mesure aussi l'ancien algorithme (lent)")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--disponibilites', action='store_true',
+                            help="Mesure la matrice de disponibilité (1 000 contrôleurs x jours ouvrés de l'année)")
+        parser.add_argument('--compare', action='store_true', help="Mesure aussi le moteur par flot et affiche les indicateurs")
+        parser.add_argument('--workers', type=int, default=None, help="Mesure aussi la planification par centre sur N processus")
+
+    def handle(self, *args, **options):
+        if options['disponibilites']:
+            self.mesurer_disponibilites(random.Random(options['seed']))
+            return
+
+        for taille in [int(t) for t in options['tailles'].split(',')]:
+            rng = random.Random(options['seed'])
+            nb_controleurs = max(1, taille // options['employeurs_par_controleur'])
+            nb_centres = max(1, nb_controleurs // options['controleurs_par_centre'])
+            jours_valides, employeurs, controleurs, conges = generer_donnees(taille, nb_controleurs, nb_centres, rng)
+
+            start = time.perf_counter()
+            probleme = Probleme(jours_valides, employeurs, controleurs, conges)
+            affectations = planifier(probleme, random.Random(options['seed']))
+            duree = time.perf_counter() - start
+            ligne = (f"{taille:>7} employeurs, {nb_controleurs:>5} contrôleurs, {nb_centres:>4} centres : "
+                     f"{duree:.2f} s, {len(affectations)} affectations")
+
+            if options['compare']:
+                for moteur in ('greedy', 'flow'):
+                    start = time.perf_counter()
+                    resultat = indicateurs(probleme, get_moteur(moteur)(probleme, random.Random(options['seed'])))
+                    ligne += (f"\n    {moteur:>6} : {time.perf_counter() - start:.2f} s, {resultat['planifies']} planifiés, "
+                              f"écart de charge {resultat['ecart_charge']}, "
+                              f"semaine moyenne pondérée {resultat['semaine_moyenne_ponderee']}")
+
+            if options['workers']:
+                start = time.perf_counter()
+                par_centre = planifier_par_centre(probleme, options['workers'], options['seed'])
+                duree_par_centre = time.perf_counter() - start
+                ligne += f" | par centre ({options['workers']} processus) : {duree_par_centre:.2f} s, {len(par_centre)} affectations"
+
+            if options['reference']:
+                start = time.perf_counter()
+                reference = planifier_reference(jours_valides, employeurs, controleurs, conges, random.Random(options['seed']))
+                duree_reference = time.perf_counter() - start
+                ligne += f" | ancien algorithme : {duree_reference:.2f} s, {len(reference)} affectations"
+
+            self.stdout.write(ligne)
+
+    def mesurer_disponibilites(self, rng, nb_controleurs=1000, nb_requetes=10000):
+        jours_valides, _, controleurs, conges = generer_donnees(0, nb_controleurs, 1, rng)
+        ids = [c for c, _ in controleurs]
+
+        start = time.perf_counter()
+        dispo = Disponibilites(jours_valides, ids, conges)
+        construction = time.perf_counter() - start
+
+        start = time.perf_counter()
+        dispo.semaines_libres()
+        semaines = time.perf_counter() - start
+
+        jours_attribution = [rng.randint(0, 100) for _ in range(7)]
+        start = time.perf_counter()
+        for semaine in range(len(dispo.semaines)):
+            dispo.jours_les_moins_charges(semaine, jours_attribution)
+        vectorise = (time.perf_counter() - start) / len(dispo.semaines)
+
+        requetes = [(rng.choice(ids), rng.randrange(len(dispo.semaines))) for _ in range(nb_requetes)]
+        start = time.perf_counter()
+        for controleur_id, semaine in requetes:
+            dispo.jour_le_moins_charge(controleur_id, semaine, jours_attribution)
+        unitaire = (time.perf_counter() - start) / nb_requetes
+
+        self.stdout.write(
+            f"{nb_controleurs} contrôleurs x {dispo.libre.shape[1]} jours : {dispo.libre.nbytes / 1024:.0f} Ko, "
+            f"construction {construction * 1000:.1f} ms, semaines libres {semaines * 1000:.2f} ms, "
+            f"jour le moins chargé {vectorise * 1e6:.0f} µs par semaine (tous les contrôleurs), "
+            f"{unitaire * 1e6:.1f} µs par requête unitaire"
+        )
@@ -0,0 +1,66 @@
+import os
+import statistics
+import time
+from io import BytesIO
+
+import boto3
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from auth_app import s3
+
+
+class Command(BaseCommand):
+    help = ("Mesure la latence par requête S3 avec un client créé à chaque appel (ancien comportement) "
+            "puis avec le client partagé. À lancer contre un S3 local, ex. : "
+            "moto_server -p 5000 puis AWS_S3_ENDPOINT_URL=http://127.0.0.1:5000")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200, help="Nombre d'allers-retours par scénario")
+        parser.add_argument('--size', type=int, default=64 * 1024, help="Taille de l'objet en octets")
+        parser.add_argument('--create-bucket', action='store_true', help="Crée le bucket s'il n'existe pas")
+
+    def handle(self, *args, **options):
+        if not settings.AWS_S3_ENDPOINT_URL:
+            self.stderr.write(self.style.WARNING("AWS_S3_ENDPOINT_URL non défini : le benchmark utilisera le vrai S3."))
+
+        bucket = settings.AWS_STORAGE_BUCKET_NAME
+        payload = os.urandom(options['size'])
+        key = "benchmarks/bench_s3.bin"
+
+        if options['create_bucket']:
+            try:
+                s3.get_s3_client().create_bucket(Bucket=bucket)
+            except s3.get_s3_client().exceptions.BucketAlreadyOwnedByYou:
+                pass
+
+        def fresh_client():
+            # Reproduit l'ancien code : un client construit pour chaque opération
+            return boto3.client(
+                's3',
+                aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                region_name=settings.AWS_S3_REGION_NAME,
+                endpoint_url=settings.AWS_S3_ENDPOINT_URL
+            )
+
+        def shared_client():
+            return s3.get_s3_client()
+
+        for label, client_factory in (("client par appel", fresh_client), ("client partagé", shared_client)):
+            client_factory()  # Préchauffage (imports, premier pool)
+            latences = []
+            for _ in range(options['requests']):
+                start = time.perf_counter()
+                client = client_factory()
+                client.upload_fileobj(BytesIO(payload), bucket, key)
+                client = client_factory()
+                client.download_fileobj(bucket, key, BytesIO())
+                latences.append((time.perf_counter() - start) * 1000)
+
+            latences.sort()
+            p95 = latences[int(len(latences) * 0.95) - 1]
+            self.stdout.write(
+                f"{label:>18} : moyenne {statistics.mean(latences):.1f} ms, "
+                f"p50 {statistics.median(latences):.1f} ms, p95 {p95:.1f} ms "
+                f"({options['requests']} upload+download de {options['size']} octets)"
+            )
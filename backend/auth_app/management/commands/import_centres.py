@@ -1,25 +1,21 @@
-import csv
-from django.core.management.base import BaseCommand
+from auth_app.importing import ImportCommand, Importer
 from auth_app.models import Centre
 
-class Command(BaseCommand):
-    help = "Importe les centres depuis un fichier CSV"
 
-    def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help="Chemin vers le fichier csv")
+class CentreImporter(Importer):
+    model = Centre
+
+    def preload(self):
+        self.existants = set(Centre.objects.values_list('nom', flat=True))
+
+    def build(self, row):
+        return Centre(nom=row['nom'].strip())
 
-    def handle(self, *args, **options):
-        csv_file = options['csv_file']
+    def key(self, centre):
+        return centre.nom
 
-        try:
-            with open(csv_file, newline='', encoding='utf-8-sig') as f:
-                reader = csv.DictReader(f)
-                count = 0
-                for row in reader:
-                    nom = row['nom'].strip()
-                    if not Centre.objects.filter(nom=nom).exists():
-                        Centre.objects.create(nom=nom)
-                        count += 1
-                self.stdout.write(self.style.SUCCESS(f"{count} centre(s) importé(s) avec succès."))
-        except Exception as e:
-            self.stderr.write(self.style.ERROR(f"Erreur : {str(e)}"))
+
+class Command(ImportCommand):
+    help = "Importe les centres depuis un fichier CSV"
+    importer_class = CentreImporter
+    label = "centre(s)"
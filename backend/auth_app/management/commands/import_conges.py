@@ -1,28 +1,34 @@
-import csv
 from datetime import datetime
-from django.core.management.base import BaseCommand
-from auth_app.models import JourConge, CustomUser  
+from auth_app import versions
+from auth_app.importing import ImportCommand, Importer
+from auth_app.models import JourConge, CustomUser
 
-class Command(BaseCommand):
-    help = "Importe les jours de congés des contrôleurs depuis un fichier CSV"
 
-    def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help="Chemin vers le fichier CSV des jours de congés")
-
-    def handle(self, *args, **options):
-        csv_file = options['csv_file']
-        count = 0
-
-        with open(csv_file, newline='', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                try:
-                    customuser_id = CustomUser.objects.get(id=row['customuser_id'], role='controleur')
-                    date_conge = datetime.strptime(row['date_conge'], "%Y-%m-%d").date()
-                    _, created = JourConge.objects.get_or_create(controleur=customuser_id, date=date_conge)
-                    if created:
-                        count += 1
-                except CustomUser.DoesNotExist:
-                    self.stdout.write(self.style.WARNING(f"Contrôleur avec ID {row['id']} introuvable."))
-
-        self.stdout.write(self.style.SUCCESS(f"{count} jour(s) de congés importé(s) avec succès."))
+class CongeImporter(Importer):
+    model = JourConge
+
+    def preload(self):
+        # id -> centre, pour invalider le calendrier des centres concernés
+        self.controleurs = dict(CustomUser.objects.filter(role='controleur').values_list('id', 'centre_id'))
+        self.existants = set(JourConge.objects.values_list('controleur_id', 'date'))
+
+    def build(self, row):
+        controleur_id = int(row['customuser_id'])
+        if controleur_id not in self.controleurs:
+            raise ValueError(f"Contrôleur avec ID {controleur_id} introuvable.")
+        date_conge = datetime.strptime(row['date_conge'].strip(), "%Y-%m-%d").date()
+        return JourConge(controleur_id=controleur_id, date=date_conge)
+
+    def key(self, conge):
+        return (conge.controleur_id, conge.date)
+
+    def write(self, objs, maj, stats):
+        super().write(objs, maj, stats)
+        # bulk_create ne déclenche pas les signaux
+        versions.bump(versions.CONGES, {self.controleurs[c.controleur_id] for c in objs})
+
+
+class Command(ImportCommand):
+    help = "Importe les jours de congés des contrôleurs depuis un fichier CSV"
+    importer_class = CongeImporter
+    label = "jour(s) de congés"
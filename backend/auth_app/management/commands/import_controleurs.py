@@ -1,35 +1,40 @@
-import csv
-from django.core.management.base import BaseCommand
+from auth_app import versions
+from auth_app.importing import ImportCommand, Importer
 from auth_app.models import CustomUser, Centre
 
-class Command(BaseCommand):
-    help = "Importe les contrôleurs depuis un fichier CSV"
 
-    def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help="Chemin vers le fichier csv des contrôleurs")
-
-    def handle(self, *args, **options):
-        csv_file = options['csv_file']
-
-        with open(csv_file, newline='', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            count = 0
-            for row in reader:
-                prenom = row['prenom'].strip()
-                nom = row['nom'].strip()
-                centre_nom = row['centre'].strip()
-                email = row['email'].strip()
-
-                centre = Centre.objects.filter(nom=centre_nom).first()
-                if centre:
-                    if not CustomUser.objects.filter(email=email).exists():
-                        CustomUser.objects.create(
-                            prenom=prenom,
-                            email=email,
-                            nom=nom,
-                            role='controleur',
-                            centre=centre,
-                            is_active=True  # ou False si tu veux qu’ils activent leur compte plus tard
-                        )
-                        count += 1
-            self.stdout.write(self.style.SUCCESS(f"{count} contrôleur(s) importé(s) avec succès.")) 
+class UtilisateurImporter(Importer):
+    # Contrôleurs et superviseurs : même fichier (prenom, nom, centre, email), rôle différent
+    model = CustomUser
+    role = 'controleur'
+
+    def preload(self):
+        self.centres = dict(Centre.objects.values_list('nom', 'id'))
+        self.existants = set(CustomUser.objects.values_list('email', flat=True))
+
+    def build(self, row):
+        centre_id = self.centres.get(row['centre'].strip())
+        if centre_id is None:
+            return None
+        return CustomUser(
+            prenom=row['prenom'].strip(),
+            email=row['email'].strip(),
+            nom=row['nom'].strip(),
+            role=self.role,
+            centre_id=centre_id,
+            is_active=True  # ou False si tu veux qu’ils activent leur compte plus tard
+        )
+
+    def key(self, utilisateur):
+        return utilisateur.email
+
+    def write(self, objs, maj, stats):
+        super().write(objs, maj, stats)
+        # bulk_create ne déclenche pas les signaux : listes de contrôleurs des centres concernés
+        versions.bump(versions.CENTRE, {u.centre_id for u in objs})
+
+
+class Command(ImportCommand):
+    help = "Importe les contrôleurs depuis un fichier CSV"
+    importer_class = UtilisateurImporter
+    label = "contrôleur(s)"
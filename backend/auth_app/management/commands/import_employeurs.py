@@ -1,39 +1,51 @@
-import csv
-from django.core.management.base import BaseCommand
-from auth_app.models import Employeur, Centre
+from auth_app import versions
+from auth_app.importing import ImportCommand, Importer
+from auth_app.models import Employeur, Centre, Planification
 
-class Command(BaseCommand):
-    help = "Importe les employeurs depuis un fichier CSV"
 
-    def add_arguments(self, parser):
-        parser.add_argument('csv_file', type=str, help="Chemin vers le fichier csv des employeurs")
-
-    def handle(self, *args, **options):
-        csv_file = options['csv_file']
-
-        with open(csv_file, newline='', encoding='utf-8-sig') as f:
-            reader = csv.DictReader(f)
-            count = 0
-            for row in reader:
-                nom = row['nom'].strip()
-                adresse = row['adresse'].strip()
-                ville = row['ville'].strip()
-                telephone = row['telephone'].strip()
-                centre_nom = row['centre'].strip()
-                score = int(row['score']) 
-                # Récupérer le centre en fonction du nom
-                centre = Centre.objects.filter(nom=centre_nom).first()
-                if centre:
-                    # Créer un employeur si ce centre existe
-                    if not Employeur.objects.filter(nom=nom, centre=centre).exists():
-                        Employeur.objects.create(
-                            nom=nom,
-                            adresse=adresse,
-                            ville=ville,
-                            centre=centre,
-                            telephone=telephone,
-                            score=score
-                        )
-                        count += 1
-            self.stdout.write(self.style.SUCCESS(f"{count} employeur(s) importé(s) avec succès."))
+class EmployeurImporter(Importer):
+    model = Employeur
+    # Clé naturelle (nom, centre) ; champs mis à jour en mode --upsert (ex. score de risque mensuel)
+    update_fields = ('adresse', 'ville', 'telephone', 'score')
+
+    def preload(self):
+        self.centres = dict(Centre.objects.values_list('nom', 'id'))
+        if self.upsert:
+            self.existants = {
+                (nom, centre_id): (pk, tuple(valeurs))
+                for pk, nom, centre_id, *valeurs in Employeur.objects.values_list('id', 'nom', 'centre_id', *self.update_fields)
+            }
+        else:
+            self.existants = set(Employeur.objects.values_list('nom', 'centre_id'))
+
+    def build(self, row):
+        # Récupérer le centre en fonction du nom ; ligne ignorée si le centre n'existe pas
+        centre_id = self.centres.get(row['centre'].strip())
+        if centre_id is None:
+            return None
+        return Employeur(
+            nom=row['nom'].strip(),
+            adresse=row['adresse'].strip(),
+            ville=row['ville'].strip(),
+            centre_id=centre_id,
+            telephone=row['telephone'].strip(),
+            score=int(row['score'])
+        )
+
+    def key(self, employeur):
+        return (employeur.nom, employeur.centre_id)
 
+    def write(self, objs, maj, stats):
+        super().write(objs, maj, stats)
+        # bulk_update ne déclenche pas les signaux : l'adresse apparaît dans les plannings
+        adresses = [obj.pk for obj, champs in maj if 'adresse' in champs]
+        if adresses:
+            versions.bump_controleurs(
+                Planification.objects.filter(employeur_id__in=adresses).values_list('controleur_id', flat=True).distinct()
+            )
+
+
+class Command(ImportCommand):
+    help = "Importe les employeurs depuis un fichier CSV"
+    importer_class = EmployeurImporter
+    label = "employeur(s)"
@@ -1,148 +1,214 @@
+import random
+import time
 from datetime import date, timedelta
-from collections import defaultdict
-import random  # Ajout de random pour la répartition aléatoire
-from django.core.management.base import BaseCommand
+from collections import Counter, defaultdict
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
-from auth_app.models import CustomUser, Employeur, JourFerie, JourConge, Planification
+from django.db.models import Q
+from django.utils import timezone
+from auth_app import versions
+from auth_app.models import CustomUser, Employeur, JourFerie, JourConge, Planification, PlanificationRun
+from auth_app.planning import JOURS_SEMAINE, MOTEURS, Probleme, get_moteur, indicateurs, planifier, planifier_par_centre
 
 
 class Command(BaseCommand):
-    help = "Effectue la planification équilibrée des contrôles (répartis de façon aléatoire sur l'année)"
-
-    @transaction.atomic
-    def handle(self, *args, **kwargs):
+    help = ("Effectue la planification équilibrée des contrôles (répartis de façon aléatoire sur l'année). "
+            "Utiliser -v 2 pour afficher chaque contrôle planifié.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Nombre de planifications par INSERT")
+        parser.add_argument('--workers', type=int, default=None,
+                            help="Planifie chaque centre séparément sur ce nombre de processus")
+        parser.add_argument('--seed', type=int, default=None, help="Graine aléatoire pour un résultat reproductible")
+        parser.add_argument('--engine', choices=MOTEURS, default='greedy',
+                            help="greedy : glouton aléatoire ; flow : flot de coût minimal (networkx)")
+        parser.add_argument('--compare', action='store_true',
+                            help="Exécute tous les moteurs sur les mêmes données et affiche leurs indicateurs, sans rien enregistrer")
+        parser.add_argument('--incremental', action='store_true',
+                            help="Déplace uniquement les contrôles touchés par les congés et jours fériés "
+                                 "ajoutés depuis la dernière exécution")
+
+    def handle(self, *args, **options):
+        if options['incremental'] and options['compare']:
+            raise CommandError("--compare ne s'applique qu'à la planification complète.")
+        self.verbose = options['verbosity'] >= 2
+        self.run = PlanificationRun(
+            mode='incremental' if options['incremental'] else 'complet',
+            seed=options['seed'],
+            started_at=timezone.now()
+        )
         today = date.today()
         end_date = date(today.year, 12, 31)
         self.stdout.write(f"Planification des contrôles du {today} au {end_date}")
 
+        # Calcul hors transaction (le pool --workers ne forke pas avec une transaction ouverte) ;
+        # seule la phase d'enregistrement est atomique
+        if options['incremental']:
+            self.replanifier(today, end_date, options)
+        else:
+            self.planifier_tout(today, end_date, options)
+
+    def charger_calendrier(self, today, end_date, controleurs=None):
         jours_feries = set(JourFerie.objects.filter(date__range=(today, end_date)).values_list('date', flat=True))
 
-        # Liste des semaines entre today et end_date avec mélange aléatoire
-        semaines = []
-        d = today
-        while d <= end_date:
-            iso_year, iso_week, _ = d.isocalendar()
-            semaines.append((iso_year, iso_week))
-            d += timedelta(days=7)
-        semaines = list(dict.fromkeys(semaines))  # Supprime les doublons
-        random.shuffle(semaines)  # Mélange aléatoire des semaines
+        jours_valides = [
+            d for d in (today + timedelta(days=i) for i in range((end_date - today).days + 1))
+            if d.weekday() < 5 and d not in jours_feries
+        ]
 
         # Congés par contrôleur
+        conges = JourConge.objects.filter(date__range=(today, end_date))
+        if controleurs is not None:
+            conges = conges.filter(controleur_id__in=controleurs)
         conges_map = defaultdict(set)
-        for cid, d in JourConge.objects.filter(date__range=(today, end_date)).values_list('controleur_id', 'date'):
+        for cid, d in conges.values_list('controleur_id', 'date'):
             conges_map[cid].add(d)
-
-        jours_valides = {
-            d for d in (today + timedelta(days=i) for i in range((end_date - today).days + 1))
-            if d.weekday() < 5 and d not in jours_feries
-        }
-
-        # Contrôleurs par centre
-        controleurs = list(CustomUser.objects.filter(role='controleur'))
-        controleurs_par_centre = defaultdict(list)
-        for c in controleurs:
-            controleurs_par_centre[c.centre].append(c)
-
-        # Contrôles déjà planifiés
-        employeurs_deja_planifies = set(Planification.objects.values_list('employeur_id', flat=True))
-        planifs_par_controleur = defaultdict(int)
-        semaines_occupees = defaultdict(set)  # (controleur_id) -> set((year, week))
-        
-        # Pour équilibrer les jours de la semaine
-        jours_attribution = defaultdict(int)  # Compteur pour chaque jour de la semaine (0-4 pour lun-ven)
-
-        # Préremplir planifs existantes si script relancé
-        for controleur_id, date_planif in Planification.objects.values_list('controleur_id', 'date'):
-            iso = date_planif.isocalendar()
-            semaines_occupees[controleur_id].add((iso[0], iso[1]))
-            planifs_par_controleur[controleur_id] += 1
-            jours_attribution[date_planif.weekday()] += 1
-
-        # Mélanger les employeurs mais garder en premier ceux avec le score le plus élevé
-        employeurs = list(Employeur.objects.order_by('-score'))  # Score décroissant
-        
-        # Division en groupes pour permettre une répartition sur l'année
-        groupes_employeurs = []
-        chunk_size = max(1, len(employeurs) // len(semaines))
-        for i in range(0, len(employeurs), chunk_size):
-            groupe = employeurs[i:i+chunk_size]
-            random.shuffle(groupe)  # Mélange dans chaque groupe
-            groupes_employeurs.append(groupe)
-        
-        # Mélanger l'ordre des groupes pour éviter des regroupements systématiques
-        random.shuffle(groupes_employeurs)
-        
-        # Aplatir la liste de groupes
-        employeurs_reordonnes = [emp for groupe in groupes_employeurs for emp in groupe]
-        
-        planifications_creees = 0
-
-        for employeur in employeurs_reordonnes:
-            if employeur.id in employeurs_deja_planifies:
-                continue
-
-            controleurs_du_centre = controleurs_par_centre.get(employeur.centre, [])
-            if not controleurs_du_centre:
-                continue
-
-            # Trier par ceux qui ont le moins de contrôles
-            controleurs_du_centre = sorted(
-                controleurs_du_centre,
-                key=lambda c: planifs_par_controleur[c.id]
+        return jours_valides, conges_map
+
+    def planifier_tout(self, today, end_date, options):
+        # Phase 1 : chargement des données
+        start = time.perf_counter()
+        jours_valides, conges_map = self.charger_calendrier(today, end_date)
+        probleme = Probleme(
+            jours_valides=jours_valides,
+            employeurs=Employeur.objects.order_by('id').values_list('id', 'centre_id', 'score'),
+            controleurs=CustomUser.objects.filter(role='controleur').order_by('id').values_list('id', 'centre_id'),
+            conges=conges_map,
+            planifs_existantes=Planification.objects.values_list('controleur_id', 'date'),
+            employeurs_deja_planifies=Planification.objects.values_list('employeur_id', flat=True),
+        )
+        self.phase("Chargement", start)
+
+        if options['compare']:
+            for moteur in MOTEURS:
+                start = time.perf_counter()
+                affectations = self.calculer(probleme, moteur, options)
+                self.indicateurs(moteur, probleme, affectations, time.perf_counter() - start)
+            return
+
+        # Phase 2 : calcul des affectations en mémoire
+        start = time.perf_counter()
+        affectations = self.calculer(probleme, options['engine'], options)
+        self.phase("Calcul", start)
+        self.indicateurs(options['engine'], probleme, affectations, time.perf_counter() - start)
+
+        # Phase 3 : enregistrement par lots
+        start = time.perf_counter()
+        self.run.created_count = len(affectations)
+        with transaction.atomic():
+            Planification.objects.bulk_create(
+                (Planification(controleur_id=controleur_id, employeur_id=employeur_id, date=jour)
+                 for controleur_id, employeur_id, jour in affectations),
+                batch_size=options['batch_size']
             )
-
-            planifie = False
-
-            # Mélanger l'ordre des semaines pour chaque employeur
-            semaines_melangees = semaines.copy()
-            random.shuffle(semaines_melangees)
-
-            for year, week in semaines_melangees:
-                if planifie:
-                    break
-
-                # Récupérer les jours valides de cette semaine
-                jours_de_la_semaine = [
-                    d for d in jours_valides
-                    if d.isocalendar()[:2] == (year, week)
-                ]
-
-                if not jours_de_la_semaine:
-                    continue
-                
-                # Classer les jours par fréquence d'utilisation (préférer les jours moins utilisés)
-                jours_de_la_semaine.sort(key=lambda d: jours_attribution[d.weekday()])
-
-                for controleur in controleurs_du_centre:
-                    if (year, week) in semaines_occupees[controleur.id]:
-                        continue
-
-                    # Trouver un jour disponible cette semaine
-                    for jour in jours_de_la_semaine:
-                        if jour in conges_map[controleur.id]:
-                            continue
-
-                        # Attribuer
-                        Planification.objects.create(
-                            controleur=controleur,
-                            employeur=employeur,
-                            date=jour
-                        )
-                        employeurs_deja_planifies.add(employeur.id)
-                        semaines_occupees[controleur.id].add((year, week))
-                        planifs_par_controleur[controleur.id] += 1
-                        jours_attribution[jour.weekday()] += 1  # Incrémenter le compteur pour ce jour
-                        planifications_creees += 1
-                        planifie = True
-                        
-                        # Log pour voir la répartition
-                        self.stdout.write(f"Contrôle planifié: {employeur.id} le {jour} ({['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi'][jour.weekday()]})")
-                        break
-
-                    if planifie:
-                        break  # Ne pas chercher d'autre contrôleur
-
-       
-       
-
-        self.stdout.write(self.style.SUCCESS(f"{planifications_creees} planifications créées avec répartition aléatoire."))
\ No newline at end of file
+            # bulk_create ne déclenche pas les signaux : ETag des calendriers concernés
+            versions.bump_controleurs({controleur_id for controleur_id, _, _ in affectations})
+            self.run.save()
+        self.phase("Enregistrement", start)
+
+        if self.verbose:
+            for controleur_id, employeur_id, jour in affectations:
+                self.stdout.write(f"Contrôle planifié: {employeur_id} le {jour} ({JOURS_SEMAINE[jour.weekday()]})")
+
+        # Résumé de la répartition par jour de la semaine
+        par_jour = Counter(jour.weekday() for _, _, jour in affectations)
+        repartition = ", ".join(f"{JOURS_SEMAINE[j]} {par_jour[j]}" for j in range(5))
+        non_planifies = len(probleme.employeurs) - len(probleme.employeurs_deja_planifies) - len(affectations)
+        self.stdout.write(f"Répartition : {repartition}")
+        if non_planifies > 0:
+            self.stdout.write(self.style.WARNING(f"{non_planifies} employeur(s) sans créneau disponible."))
+        self.stdout.write(self.style.SUCCESS(f"{len(affectations)} planifications créées (moteur {options['engine']})."))
+
+    def replanifier(self, today, end_date, options):
+        derniere = PlanificationRun.objects.order_by('-started_at').first()
+        if derniere is None:
+            raise CommandError("Aucune exécution précédente : lancer d'abord la planification complète.")
+        self.stdout.write(f"Changements depuis l'exécution du {derniere.started_at:%Y-%m-%d %H:%M}")
+
+        # Phase 1 : contrôles à venir en conflit avec un congé ou un jour férié ajouté ou modifié depuis
+        start = time.perf_counter()
+        depuis = Q(created_at__gt=derniere.started_at) | Q(updated_at__gt=derniere.started_at)
+        nouveaux_feries = set(JourFerie.objects.filter(
+            depuis, date__range=(today, end_date)
+        ).values_list('date', flat=True))
+        nouveaux_conges = set(JourConge.objects.filter(
+            depuis, date__range=(today, end_date)
+        ).values_list('controleur_id', 'date'))
+
+        conflits = [
+            planif for planif in Planification.objects.filter(date__range=(today, end_date)).filter(
+                Q(date__in=nouveaux_feries) | Q(controleur_id__in={c for c, _ in nouveaux_conges})
+            ).select_related('employeur').order_by('id')
+            if planif.date in nouveaux_feries or (planif.controleur_id, planif.date) in nouveaux_conges
+        ]
+        if not conflits:
+            self.phase("Chargement", start)
+            self.run.save()
+            self.stdout.write(self.style.SUCCESS("Aucun contrôle à déplacer."))
+            return
+
+        # Seuls les centres des contrôles en conflit sont recalculés
+        centres = {planif.employeur.centre_id for planif in conflits}
+        controleurs = list(CustomUser.objects.filter(role='controleur', centre_id__in=centres).values_list('id', 'centre_id'))
+        ids_controleurs = [c for c, _ in controleurs]
+        jours_valides, conges_map = self.charger_calendrier(today, end_date, ids_controleurs)
+        probleme = Probleme(
+            jours_valides=jours_valides,
+            employeurs=[(p.employeur_id, p.employeur.centre_id, p.employeur.score) for p in conflits],
+            controleurs=controleurs,
+            conges=conges_map,
+            planifs_existantes=Planification.objects.filter(controleur_id__in=ids_controleurs)
+            .exclude(id__in=[p.id for p in conflits]).values_list('controleur_id', 'date'),
+        )
+        self.phase("Chargement", start)
+
+        # Phase 2 : nouveau créneau, dans la même semaine si possible
+        start = time.perf_counter()
+        preferences = {p.employeur_id: p.date.isocalendar()[:2] for p in conflits}
+        affectations = planifier(probleme, random.Random(options['seed']), preferences)
+        nouveaux = {employeur_id: (controleur_id, jour) for controleur_id, employeur_id, jour in affectations}
+        self.phase("Calcul", start)
+
+        # Phase 3 : mise à jour des lignes existantes (les documents restent attachés)
+        start = time.perf_counter()
+        deplaces = []
+        for planif in conflits:
+            avant = {"controleur": planif.controleur_id, "date": planif.date.isoformat()}
+            apres = None
+            if planif.employeur_id in nouveaux:
+                planif.controleur_id, planif.date = nouveaux[planif.employeur_id]
+                apres = {"controleur": planif.controleur_id, "date": planif.date.isoformat()}
+                deplaces.append(planif)
+            self.run.diff.append({"planification": planif.id, "employeur": planif.employeur_id, "avant": avant, "apres": apres})
+        self.run.moved_count = len(deplaces)
+        with transaction.atomic():
+            Planification.objects.bulk_update(deplaces, ['controleur', 'date'], batch_size=options['batch_size'])
+            versions.bump_controleurs({ligne["avant"]["controleur"] for ligne in self.run.diff if ligne["apres"]}
+                                      | {planif.controleur_id for planif in deplaces})
+            self.run.save()
+        self.phase("Enregistrement", start)
+
+        for ligne in self.run.diff:
+            avant, apres = ligne["avant"], ligne["apres"]
+            destination = f"contrôleur {apres['controleur']} le {apres['date']}" if apres else "aucun créneau disponible"
+            self.stdout.write(f"Employeur {ligne['employeur']} : contrôleur {avant['controleur']} le {avant['date']} -> {destination}")
+
+        non_deplaces = len(conflits) - len(deplaces)
+        if non_deplaces:
+            self.stdout.write(self.style.WARNING(f"{non_deplaces} contrôle(s) en conflit laissé(s) en place, sans créneau disponible."))
+        self.stdout.write(self.style.SUCCESS(f"{len(deplaces)} planifications déplacées sur {len(conflits)} en conflit."))
+
+    def calculer(self, probleme, moteur, options):
+        if options['workers']:
+            return planifier_par_centre(probleme, options['workers'], options['seed'], moteur)
+        return get_moteur(moteur)(probleme, random.Random(options['seed']))
+
+    def indicateurs(self, moteur, probleme, affectations, duree):
+        resultat = indicateurs(probleme, affectations)
+        self.stdout.write(
+            f"Moteur {moteur} : {duree:.2f} s, {resultat['planifies']} planifiés, {resultat['non_planifies']} non planifiés, "
+            f"écart de charge {resultat['ecart_charge']}, semaine moyenne pondérée par le score {resultat['semaine_moyenne_ponderee']}"
+        )
+
+    def phase(self, nom, start):
+        self.stdout.write(f"{nom} : {time.perf_counter() - start:.2f} s")
@@ -0,0 +1,28 @@
+import time
+from django.core.management.base import BaseCommand
+from auth_app import metrics
+from auth_app.analysis import evict_cache
+from auth_app.tasks import run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Exécute les jobs d'analyse de documents en attente (extraction, analyse OpenAI, rapport PDF)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Traite les jobs en attente puis s'arrête")
+        parser.add_argument('--sleep', type=float, default=5, help="Pause en secondes quand la file est vide")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Démarrage du worker d'analyse des documents")
+        while True:
+            processed = run_pending_jobs()
+            if processed:
+                self.stdout.write(f"{processed} job(s) traité(s)")
+                evicted = evict_cache()
+                if evicted:
+                    self.stdout.write(f"{evicted} entrée(s) retirée(s) du cache d'analyse")
+                metrics.flush()
+            if options['once']:
+                break
+            time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS("Worker arrêté."))
@@ -0,0 +1,48 @@
+# auth_app/metrics.py
+
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import MetricCounter
+
+# Les incréments sont regroupés en mémoire puis écrits en base au plus toutes les
+# METRICS_FLUSH_INTERVAL secondes, pour ne pas ajouter une écriture par requête.
+_lock = threading.Lock()
+_pending = Counter()
+_last_flush = time.monotonic()
+
+
+def incr(name, amount=1):
+    with _lock:
+        _pending[name] += amount
+        due = time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL
+    if due:
+        flush()
+
+
+def flush():
+    global _last_flush
+    with _lock:
+        pending = dict(_pending)
+        _pending.clear()
+        _last_flush = time.monotonic()
+
+    for name, amount in pending.items():
+        if MetricCounter.objects.filter(name=name).update(value=F('value') + amount):
+            continue
+        try:
+            with transaction.atomic():
+                MetricCounter.objects.create(name=name, value=amount)
+        except IntegrityError:
+            # Créé entre-temps par un autre processus
+            MetricCounter.objects.filter(name=name).update(value=F('value') + amount)
+
+
+def snapshot():
+    flush()
+    return dict(MetricCounter.objects.order_by('name').values_list('name', 'value'))
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:32
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0014_analysiscacheentry_metriccounter'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanificationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mode', models.CharField(choices=[('complet', 'Complet'), ('incremental', 'Incrémental')], max_length=20)),
+                ('seed', models.BigIntegerField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_count', models.PositiveIntegerField(default=0)),
+                ('moved_count', models.PositiveIntegerField(default=0)),
+                ('diff', models.JSONField(blank=True, default=list)),
+            ],
+        ),
+        # Ajout sans auto_now_add pour laisser les lignes existantes à NULL
+        migrations.AddField(
+            model_name='jourconge',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='jourconge',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+        # Ajout sans auto_now_add pour laisser les lignes existantes à NULL
+        migrations.AddField(
+            model_name='jourferie',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='jourferie',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, null=True),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:48
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def doublons(queryset, fields):
+    # (valeurs de la clé, id conservé) pour chaque clé présente plusieurs fois
+    return queryset.values(*fields).annotate(n=Count('id'), garde=Min('id')).filter(n__gt=1)
+
+
+def dedoublonner(apps, schema_editor):
+    # Les contraintes d'unicité échoueraient sur des doublons existants : on garde la ligne la plus ancienne
+    JourConge = apps.get_model('auth_app', 'JourConge')
+    JourFerie = apps.get_model('auth_app', 'JourFerie')
+    Employeur = apps.get_model('auth_app', 'Employeur')
+    Planification = apps.get_model('auth_app', 'Planification')
+
+    for doublon in doublons(JourConge.objects.all(), ['controleur', 'date']):
+        JourConge.objects.filter(controleur=doublon['controleur'], date=doublon['date']).exclude(id=doublon['garde']).delete()
+
+    for doublon in doublons(JourFerie.objects.all(), ['date']):
+        JourFerie.objects.filter(date=doublon['date']).exclude(id=doublon['garde']).delete()
+
+    # Employeurs en double : les planifications sont rattachées à l'employeur conservé avant suppression
+    for doublon in doublons(Employeur.objects.filter(centre__isnull=False), ['centre', 'nom']):
+        autres = Employeur.objects.filter(centre=doublon['centre'], nom=doublon['nom']).exclude(id=doublon['garde'])
+        Planification.objects.filter(employeur__in=autres).update(employeur_id=doublon['garde'])
+        autres.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('auth_app', '0015_planificationrun_jourconge_created_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(dedoublonner, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='jourferie',
+            name='date',
+            field=models.DateField(unique=True),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['role', 'centre'], name='auth_app_cu_role_0ae4f2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='planification',
+            index=models.Index(fields=['controleur', 'date'], name='auth_app_pl_control_b9f721_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='employeur',
+            constraint=models.UniqueConstraint(fields=('centre', 'nom'), name='unique_employeur_centre_nom'),
+        ),
+        migrations.AddConstraint(
+            model_name='jourconge',
+            constraint=models.UniqueConstraint(fields=('controleur', 'date'), name='unique_jourconge_controleur_date'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:54
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0016_indexes_and_unique_constraints'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlanningVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('scope', models.CharField(choices=[('controleur', 'Contrôleur'), ('centre', 'Centre')], max_length=20)),
+                ('object_id', models.BigIntegerField()),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('scope', 'object_id'), name='unique_planningversion_scope_object')],
+            },
+        ),
+    ]
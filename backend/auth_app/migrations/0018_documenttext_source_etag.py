@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0017_planningversion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documenttext',
+            name='source_etag',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+    ]
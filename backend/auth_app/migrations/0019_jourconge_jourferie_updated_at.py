@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0018_documenttext_source_etag'),
+    ]
+
+    operations = [
+        # Ajout sans auto_now pour laisser les lignes existantes à NULL
+        migrations.AddField(
+            model_name='jourconge',
+            name='updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='jourconge',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+        # Ajout sans auto_now pour laisser les lignes existantes à NULL
+        migrations.AddField(
+            model_name='jourferie',
+            name='updated_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AlterField(
+            model_name='jourferie',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
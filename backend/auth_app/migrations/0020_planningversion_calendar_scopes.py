@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth_app', '0019_jourconge_jourferie_updated_at'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='planningversion',
+            name='scope',
+            field=models.CharField(choices=[('controleur', 'Contrôleur'), ('centre', 'Centre'), ('conges', 'Congés du centre'), ('feries', 'Jours fériés')], max_length=20),
+        ),
+    ]
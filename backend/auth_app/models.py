@@ -1,6 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, PermissionsMixin
 from django.contrib.auth.base_user import BaseUserManager
+from django.utils import timezone
 
 class Centre (models.Model):
     nom = models.CharField(max_length=200)
@@ -48,6 +49,9 @@ class CustomUser(AbstractUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS =[]
+
+    class Meta(AbstractUser.Meta):
+        indexes = [models.Index(fields=['role', 'centre'])]  # contrôleurs d'un centre
 def __str__(self):
     return self.email
 
@@ -65,13 +69,19 @@ class Employeur(models.Model):
     def __str__(self):
         return f"{self.nom} - {self.ville}"
 
+    class Meta:
+        # Clé naturelle utilisée par les imports
+        constraints = [models.UniqueConstraint(fields=['centre', 'nom'], name='unique_employeur_centre_nom')]
+
 
 
 
 class JourFerie(models.Model):
     
     nom = models.CharField(max_length=255, blank=True, null=True)  # Description du jour férié (ex : "Fête nationale")
-    date = models.DateField()  # Date du jour férié
+    date = models.DateField(unique=True)  # Date du jour férié
+    created_at = models.DateTimeField(auto_now_add=True, null=True)  # null pour les lignes antérieures au suivi
+    updated_at = models.DateTimeField(auto_now=True, null=True)  # date corrigée : à replanifier aussi
     def __str__(self):
         return f"{self.date} - {self.nom if self.nom else 'Jour férié'}"
 
@@ -85,10 +95,15 @@ class JourConge(models.Model):
         related_name='jours_conges'
     )
     date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True, null=True)  # null pour les lignes antérieures au suivi
+    updated_at = models.DateTimeField(auto_now=True, null=True)  # date modifiée : à replanifier aussi
 
     def __str__(self):
         return f"{self.controleur} - {self.date}"
 
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['controleur', 'date'], name='unique_jourconge_controleur_date')]
+
 
 class Planification(models.Model):
     controleur = models.ForeignKey(CustomUser, on_delete=models.CASCADE, limit_choices_to={'role': 'controleur'})
@@ -98,6 +113,10 @@ class Planification(models.Model):
     def __str__(self):
         return f"{self.date} - {self.controleur.email} -> {self.employeur.nom}"
 
+    class Meta:
+        # Plannings d'un contrôleur par date ; employeur_id est déjà indexé par sa clé étrangère
+        indexes = [models.Index(fields=['controleur', 'date'])]
+
 
 
 class Document(models.Model):
@@ -109,6 +128,19 @@ class Document(models.Model):
         return f"Document for Planification {self.planification.id} - {self.url}"
     
 
+class DocumentText(models.Model):
+    # Texte extrait une seule fois par document, réutilisé par toutes les analyses suivantes
+    document = models.OneToOneField(Document, on_delete=models.CASCADE, related_name='extracted_text')
+    text = models.TextField(blank=True)
+    content_hash = models.CharField(max_length=64, db_index=True)  # SHA-256 du fichier source
+    source_etag = models.CharField(max_length=100, blank=True)  # ETag S3 de l'objet extrait (fichier remplacé depuis ?)
+    page_count = models.PositiveIntegerField(default=0)
+    extracted_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Texte du document {self.document_id} ({self.page_count} pages)"
+
+
 class SummaryReport(models.Model):
     planification = models.OneToOneField(Planification, on_delete=models.CASCADE, related_name='summary_report')
     report_url = models.URLField(max_length=500)
@@ -119,4 +151,95 @@ class SummaryReport(models.Model):
 
     class Meta:
         verbose_name = "Rapport de synthèse"
-        verbose_name_plural = "Rapports de synthèse"    
\ No newline at end of file
+        verbose_name_plural = "Rapports de synthèse"
+
+
+class PlanificationRun(models.Model):
+    # Journal des exécutions de la commande planification (base de la replanification incrémentale)
+    MODE_CHOICES = [
+        ('complet', 'Complet'),
+        ('incremental', 'Incrémental'),
+    ]
+
+    mode = models.CharField(max_length=20, choices=MODE_CHOICES)
+    seed = models.BigIntegerField(null=True, blank=True)
+    started_at = models.DateTimeField(default=timezone.now)
+    created_count = models.PositiveIntegerField(default=0)
+    moved_count = models.PositiveIntegerField(default=0)
+    diff = models.JSONField(default=list, blank=True)  # affectations déplacées : avant / après
+
+    def __str__(self):
+        return f"{self.started_at:%Y-%m-%d %H:%M} - {self.mode} ({self.created_count} créées, {self.moved_count} déplacées)"
+
+
+class AnalysisJob(models.Model):
+    # File d'attente en base de données pour l'analyse des documents d'une planification
+    STATUS_CHOICES = [
+        ('pending', 'En attente'),
+        ('running', 'En cours'),
+        ('done', 'Terminé'),
+        ('failed', 'Échoué'),
+    ]
+
+    planification = models.ForeignKey(Planification, on_delete=models.CASCADE, related_name='analysis_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    last_error = models.TextField(blank=True)
+    run_after = models.DateTimeField(default=timezone.now)  # Date avant laquelle le job ne doit pas être repris (backoff)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Analyse {self.id} - Planification {self.planification_id} ({self.status})"
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+
+class AnalysisCacheEntry(models.Model):
+    # Résumé d'un segment, adressé par le hash (modèle, version des prompts, texte du segment)
+    key = models.CharField(max_length=64, unique=True)
+    model = models.CharField(max_length=100)
+    prompt_version = models.PositiveIntegerField()
+    summary = models.TextField()
+    hit_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)  # pour l'éviction LRU
+
+    def __str__(self):
+        return f"{self.model} v{self.prompt_version} - {self.key[:12]}"
+
+
+class MetricCounter(models.Model):
+    # Compteurs d'exploitation partagés entre processus (web et workers)
+    name = models.CharField(max_length=100, unique=True)
+    value = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} = {self.value}"
+
+
+class PlanningVersion(models.Model):
+    # Version des plannings d'un contrôleur, de la liste des contrôleurs ou des congés
+    # d'un centre, ou des jours fériés (object_id 0), incrémentée à chaque modification
+    # (ETag et clés de cache des endpoints calendrier)
+    SCOPE_CHOICES = [
+        ('controleur', 'Contrôleur'),
+        ('centre', 'Centre'),
+        ('conges', 'Congés du centre'),
+        ('feries', 'Jours fériés'),
+    ]
+
+    scope = models.CharField(max_length=20, choices=SCOPE_CHOICES)
+    object_id = models.BigIntegerField()
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.scope} {self.object_id} v{self.version}"
+
+    class Meta:
+        constraints = [models.UniqueConstraint(fields=['scope', 'object_id'], name='unique_planningversion_scope_object')]
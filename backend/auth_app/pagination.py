@@ -0,0 +1,78 @@
+# auth_app/pagination.py
+
+"""Filtres de période et pagination par curseur des plannings.
+
+Le curseur encode la dernière ligne renvoyée (date, id) : la page suivante est lue
+par ``(date, id) > curseur`` sur l'index (controleur, date), sans OFFSET, donc en
+temps constant quelle que soit la profondeur dans l'historique.
+"""
+
+import base64
+import calendar
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+
+
+def parse_jour(valeur, nom):
+    try:
+        return date.fromisoformat(valeur)
+    except ValueError:
+        raise ValueError(f"Paramètre {nom} invalide (format AAAA-MM-JJ attendu).")
+
+
+def periode(params):
+    # (début, fin) demandés, bornes incluses ; None si la borne est absente
+    mois = params.get('month')
+    if mois:
+        try:
+            annee, numero = (int(v) for v in mois.split('-'))
+            debut = date(annee, numero, 1)
+        except ValueError:
+            raise ValueError("Paramètre month invalide (format AAAA-MM attendu).")
+        fin = date(annee, numero, calendar.monthrange(annee, numero)[1])
+        # Semaines complètes, comme la grille affichée par la vue mois
+        return debut - timedelta(days=debut.weekday()), fin + timedelta(days=6 - fin.weekday())
+    debut = parse_jour(params['from'], 'from') if params.get('from') else None
+    fin = parse_jour(params['to'], 'to') if params.get('to') else None
+    return debut, fin
+
+
+def encode_cursor(jour, pk):
+    return base64.urlsafe_b64encode(f"{jour}|{pk}".encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        jour, pk = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return date.fromisoformat(jour), int(pk)
+    except (ValueError, UnicodeError):
+        raise ValueError("Curseur invalide.")
+
+
+def page_size(params):
+    try:
+        taille = int(params.get('limit') or settings.PLANNING_PAGE_SIZE)
+    except ValueError:
+        raise ValueError("Paramètre limit invalide.")
+    return max(1, min(taille, settings.PLANNING_PAGE_SIZE_MAX))
+
+
+def is_paginated(params):
+    return 'cursor' in params or 'limit' in params
+
+
+def filter_planifications(queryset, params):
+    # Sans paramètre de période ni de pagination, le queryset est renvoyé tel quel
+    if not any(p in params for p in ('from', 'to', 'month', 'cursor', 'limit')):
+        return queryset
+    debut, fin = periode(params)
+    if debut:
+        queryset = queryset.filter(date__gte=debut)
+    if fin:
+        queryset = queryset.filter(date__lte=fin)
+    if params.get('cursor'):
+        jour, pk = decode_cursor(params['cursor'])
+        queryset = queryset.filter(Q(date__gt=jour) | Q(date=jour, id__gt=pk))
+    return queryset.order_by('date', 'id')
@@ -0,0 +1,212 @@
+# auth_app/planning.py
+
+"""Algorithme de planification des contrôles, indépendant de l'ORM.
+
+Le problème est décrit uniquement par des identifiants et des dates : la commande
+``manage.py planification`` charge les données, appelle ``planifier`` puis enregistre
+les affectations, et ``manage.py bench_planification`` l'exécute sur des données
+synthétiques.
+"""
+
+import copy
+import heapq
+import itertools
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+
+from .availability import Disponibilites
+
+JOURS_SEMAINE = ['Lundi', 'Mardi', 'Mercredi', 'Jeudi', 'Vendredi']
+
+
+class Probleme:
+    """Données d'entrée de la planification.
+
+    employeurs : liste de (id, centre_id, score) ; controleurs : liste de (id, centre_id) ;
+    conges : controleur_id -> ensemble de dates ; planifs_existantes : (controleur_id, date).
+    Les disponibilités sont tenues dans une matrice NumPy (availability.Disponibilites).
+    """
+
+    def __init__(self, jours_valides, employeurs, controleurs, conges=None, planifs_existantes=(), employeurs_deja_planifies=()):
+        controleurs = list(controleurs)
+        planifs_existantes = list(planifs_existantes)
+        self.employeurs = list(employeurs)
+        self.employeurs_deja_planifies = set(employeurs_deja_planifies)
+        self.dispo = Disponibilites(jours_valides, [c for c, _ in controleurs], conges, planifs_existantes)
+        self.semaines = self.dispo.semaines
+
+        self.controleurs_par_centre = defaultdict(list)
+        for controleur_id, centre_id in controleurs:
+            self.controleurs_par_centre[centre_id].append(controleur_id)
+
+        # Préremplir avec les planifications existantes si la commande est relancée
+        self.charges = {controleur_id: 0 for controleur_id, _ in controleurs}
+        self.jours_attribution = [0] * 7
+        for controleur_id, date_planif in planifs_existantes:
+            self.charges[controleur_id] = self.charges.get(controleur_id, 0) + 1
+            self.jours_attribution[date_planif.weekday()] += 1
+
+        # Bitset des semaines libres par contrôleur : bit i à 1 si la semaine i n'est pas
+        # déjà occupée et contient au moins un jour valide hors congés
+        self.semaines_libres = self.dispo.bitsets_semaines_libres()
+
+    def sous_probleme(self, centre_id, employeurs):
+        # Les centres sont indépendants : un contrôleur ne visite que les employeurs de son centre
+        controleurs = self.controleurs_par_centre.get(centre_id, [])
+        ids = {e[0] for e in employeurs}
+        sous = copy.copy(self)
+        sous.employeurs = employeurs
+        sous.employeurs_deja_planifies = self.employeurs_deja_planifies & ids
+        sous.controleurs_par_centre = {centre_id: controleurs}
+        sous.dispo = self.dispo.extraire(controleurs)
+        sous.charges = {c: self.charges[c] for c in controleurs}
+        sous.semaines_libres = {c: self.semaines_libres[c] for c in controleurs}
+        return sous
+
+
+def ordonner_employeurs(employeurs, nb_semaines, rng):
+    # Score décroissant, découpé en groupes mélangés pour répartir les contrôles sur l'année
+    employeurs = sorted(employeurs, key=lambda e: -e[2])
+    groupes = []
+    taille = max(1, len(employeurs) // max(1, nb_semaines))
+    for i in range(0, len(employeurs), taille):
+        groupe = employeurs[i:i + taille]
+        rng.shuffle(groupe)
+        groupes.append(groupe)
+    rng.shuffle(groupes)
+    return [employeur for groupe in groupes for employeur in groupe]
+
+
+def semaines_aleatoires(nb_semaines, rng):
+    # Fisher-Yates paresseux : on s'arrête dès que l'employeur est placé
+    ordre = list(range(nb_semaines))
+    for i in range(nb_semaines):
+        j = rng.randrange(i, nb_semaines)
+        ordre[i], ordre[j] = ordre[j], ordre[i]
+        yield ordre[i]
+
+
+def controleur_le_moins_charge(tas, semaine, charges, semaines_libres):
+    # Les entrées périmées (semaine prise ou charge changée) sont nettoyées à la lecture
+    while tas:
+        charge, controleur_id = tas[0]
+        if not semaines_libres[controleur_id] >> semaine & 1:
+            heapq.heappop(tas)
+        elif charge != charges[controleur_id]:
+            heapq.heapreplace(tas, (charges[controleur_id], controleur_id))
+        else:
+            return controleur_id
+    return None
+
+
+def planifier(probleme, rng=None, preferences=None):
+    """Glouton aléatoire : pour chaque employeur, semaines tirées au hasard, contrôleur
+    le moins chargé libre cette semaine, jour de la semaine le moins utilisé.
+
+    preferences : employeur_id -> semaine ISO (année, semaine) essayée en premier,
+    utilisé pour déplacer une affectation le moins possible.
+    Retourne la liste des affectations (controleur_id, employeur_id, date).
+    """
+    rng = rng or random.Random()
+    preferences = preferences or {}
+    semaines = probleme.semaines
+    index_semaines = {semaine: i for i, semaine in enumerate(semaines)}
+    charges = dict(probleme.charges)
+    semaines_libres = dict(probleme.semaines_libres)
+    jours_attribution = list(probleme.jours_attribution)
+
+    # Un tas (charge, controleur_id) par centre et par semaine, limité aux contrôleurs libres
+    tas_par_semaine = {}
+    for centre_id, controleurs in probleme.controleurs_par_centre.items():
+        for i in range(len(semaines)):
+            tas = [(charges[c], c) for c in controleurs if semaines_libres[c] >> i & 1]
+            heapq.heapify(tas)
+            tas_par_semaine[centre_id, i] = tas
+
+    affectations = []
+    for employeur_id, centre_id, _ in ordonner_employeurs(probleme.employeurs, len(semaines), rng):
+        if employeur_id in probleme.employeurs_deja_planifies:
+            continue
+        if centre_id not in probleme.controleurs_par_centre:
+            continue
+
+        ordre = semaines_aleatoires(len(semaines), rng)
+        if preferences.get(employeur_id) in index_semaines:
+            ordre = itertools.chain([index_semaines[preferences[employeur_id]]], ordre)
+
+        for i in ordre:
+            tas = tas_par_semaine[centre_id, i]
+            controleur_id = controleur_le_moins_charge(tas, i, charges, semaines_libres)
+            if controleur_id is None:
+                continue
+
+            # Jour disponible le moins utilisé (préférer les jours de la semaine moins chargés)
+            jour = probleme.dispo.jour_le_moins_charge(controleur_id, i, jours_attribution)
+
+            heapq.heappop(tas)
+            semaines_libres[controleur_id] &= ~(1 << i)
+            charges[controleur_id] += 1
+            jours_attribution[jour.weekday()] += 1
+            affectations.append((controleur_id, employeur_id, jour))
+            break
+
+    return affectations
+
+
+MOTEURS = ('greedy', 'flow')
+
+
+def get_moteur(nom):
+    # Moteur = fonction (probleme, rng) -> affectations ; le moteur par flot nécessite networkx
+    if nom == 'flow':
+        from .planning_flow import planifier_flot
+        return planifier_flot
+    return planifier
+
+
+def indicateurs(probleme, affectations):
+    # Indicateurs de qualité pour comparer les moteurs sur les mêmes données
+    charges = dict(probleme.charges)
+    for controleur_id, _, _ in affectations:
+        charges[controleur_id] += 1
+    scores = {e[0]: e[2] for e in probleme.employeurs}
+    index_semaines = {semaine: i for i, semaine in enumerate(probleme.semaines)}
+    poids = sum(scores[e] for _, e, _ in affectations)
+    semaine_ponderee = sum(scores[e] * (index_semaines[j.isocalendar()[:2]] + 1) for _, e, j in affectations)
+    a_planifier = sum(1 for e in probleme.employeurs if e[0] not in probleme.employeurs_deja_planifies)
+    return {
+        'planifies': len(affectations),
+        'non_planifies': a_planifier - len(affectations),
+        'ecart_charge': max(charges.values()) - min(charges.values()) if charges else 0,
+        'semaine_moyenne_ponderee': round(semaine_ponderee / poids, 2) if poids else None,
+    }
+
+
+def rng_centre(seed, centre_id):
+    # Graine dérivée par centre : le résultat ne dépend ni de l'ordre ni du nombre de processus
+    return random.Random(f"{seed}:{centre_id}") if seed is not None else random.Random()
+
+
+def planifier_centre(probleme, centre_id, seed, moteur='greedy'):
+    return get_moteur(moteur)(probleme, rng_centre(seed, centre_id))
+
+
+def planifier_par_centre(probleme, workers=1, seed=None, moteur='greedy'):
+    """Résout chaque centre séparément, en parallèle sur `workers` processus.
+
+    L'équilibrage des jours de la semaine se fait alors centre par centre.
+    """
+    employeurs_par_centre = defaultdict(list)
+    for employeur in probleme.employeurs:
+        employeurs_par_centre[employeur[1]].append(employeur)
+    centres = sorted(probleme.controleurs_par_centre, key=lambda c: (c is None, c))
+    sous_problemes = [probleme.sous_probleme(c, employeurs_par_centre[c]) for c in centres]
+    if workers > 1 and len(centres) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(centres))) as executor:
+            resultats = list(executor.map(
+                planifier_centre, sous_problemes, centres, [seed] * len(centres), [moteur] * len(centres)
+            ))
+    else:
+        resultats = [planifier_centre(sous, centre_id, seed, moteur) for sous, centre_id in zip(sous_problemes, centres)]
+    return [affectation for affectations in resultats for affectation in affectations]
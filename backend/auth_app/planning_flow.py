@@ -0,0 +1,74 @@
+# auth_app/planning_flow.py
+
+"""Moteur de planification par flot de coût minimal (networkx).
+
+Pour chaque centre : source -> semaine (coût croissant avec le nombre de contrôles
+de la semaine, pour les étaler sur l'année), semaine -> contrôleur (capacité 1 si le
+contrôleur est libre cette semaine), contrôleur -> puits (coût croissant avec sa
+charge). Les créneaux obtenus sont ensuite attribués aux employeurs par score
+décroissant dans l'ordre des semaines.
+"""
+
+import random
+from collections import defaultdict
+
+import networkx as nx
+
+def creneaux_centre(probleme, controleurs, nb_employeurs):
+    # Retourne les créneaux (indice de semaine, controleur_id) choisis par le flot
+    graphe = nx.MultiDiGraph()
+    paires = 0
+    for i in range(len(probleme.semaines)):
+        libres = [c for c in controleurs if probleme.semaines_libres[c] >> i & 1]
+        for k, controleur_id in enumerate(libres):
+            # Coûts convexes : le k-ième contrôle de la semaine coûte k
+            graphe.add_edge('source', ('semaine', i), capacity=1, weight=k)
+            graphe.add_edge(('semaine', i), ('controleur', controleur_id), capacity=1, weight=0)
+        paires += len(libres)
+
+    for controleur_id in controleurs:
+        charge = probleme.charges[controleur_id]
+        for k in range(bin(probleme.semaines_libres[controleur_id]).count('1')):
+            graphe.add_edge(('controleur', controleur_id), 'puits', capacity=1, weight=charge + k)
+
+    flux = min(nb_employeurs, paires)
+    if flux == 0:
+        return []
+    graphe.add_node('source', demand=-flux)
+    graphe.add_node('puits', demand=flux)
+    flot = nx.min_cost_flow(graphe)
+
+    creneaux = []
+    for i in range(len(probleme.semaines)):
+        for controleur_id, arcs in flot.get(('semaine', i), {}).items():
+            if arcs[0]:
+                creneaux.append((i, controleur_id[1]))
+    return sorted(creneaux)
+
+
+def planifier_flot(probleme, rng=None):
+    """Même contrat que planning.planifier : liste de (controleur_id, employeur_id, date)."""
+    rng = rng or random.Random()
+    jours_attribution = list(probleme.jours_attribution)
+
+    employeurs_par_centre = defaultdict(list)
+    for employeur in probleme.employeurs:
+        if employeur[0] not in probleme.employeurs_deja_planifies:
+            employeurs_par_centre[employeur[1]].append(employeur)
+
+    affectations = []
+    for centre_id in sorted(probleme.controleurs_par_centre, key=lambda c: (c is None, c)):
+        controleurs = probleme.controleurs_par_centre[centre_id]
+        employeurs = employeurs_par_centre.get(centre_id, [])
+        if not employeurs:
+            continue
+        # Scores égaux départagés au hasard, puis les meilleurs scores sur les premières semaines
+        rng.shuffle(employeurs)
+        employeurs.sort(key=lambda e: -e[2])
+
+        for (i, controleur_id), (employeur_id, _, _) in zip(creneaux_centre(probleme, controleurs, len(employeurs)), employeurs):
+            jour = probleme.dispo.jour_le_moins_charge(controleur_id, i, jours_attribution)
+            jours_attribution[jour.weekday()] += 1
+            affectations.append((controleur_id, employeur_id, jour))
+
+    return affectations
@@ -0,0 +1,161 @@
+# auth_app/s3.py
+
+import os
+import re
+import threading
+import uuid
+from urllib.parse import quote
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from django.conf import settings
+
+# Client S3 partagé par tout le processus : les clients boto3 sont thread-safe,
+# seule leur création (résolution des credentials, endpoint, pool) est coûteuse.
+_lock = threading.Lock()
+_client = None
+_transfer_config = None
+
+
+def get_s3_client():
+    global _client
+    if _client is None:
+        with _lock:
+            if _client is None:
+                session = boto3.session.Session(
+                    aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
+                    aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
+                    region_name=settings.AWS_S3_REGION_NAME
+                )
+                _client = session.client(
+                    's3',
+                    endpoint_url=settings.AWS_S3_ENDPOINT_URL,
+                    config=Config(
+                        max_pool_connections=settings.AWS_S3_MAX_POOL_CONNECTIONS,
+                        tcp_keepalive=True,
+                        connect_timeout=settings.AWS_S3_CONNECT_TIMEOUT,
+                        read_timeout=settings.AWS_S3_READ_TIMEOUT,
+                        retries={'max_attempts': 3, 'mode': 'standard'},
+                    )
+                )
+    return _client
+
+
+def get_transfer_config():
+    global _transfer_config
+    if _transfer_config is None:
+        _transfer_config = TransferConfig(
+            multipart_threshold=settings.AWS_S3_MULTIPART_THRESHOLD,
+            multipart_chunksize=settings.AWS_S3_MULTIPART_CHUNKSIZE,
+            max_concurrency=settings.AWS_S3_MAX_CONCURRENCY,
+            use_threads=True,
+        )
+    return _transfer_config
+
+
+def object_url(key):
+    return f"https://{settings.AWS_STORAGE_BUCKET_NAME}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/{key}"
+
+
+def key_from_url(file_url):
+    return file_url.replace(object_url(""), "")
+
+
+def document_prefix(planification_id):
+    return f"documents/planification-{planification_id}/"
+
+
+def document_key(planification_id, file_name):
+    # Seul le nom de base est conservé, sous un identifiant unique : deux envois du même
+    # nom ne se remplacent jamais et une annulation ne supprime que ses propres objets
+    name = os.path.basename(file_name.replace("\\", "/"))
+    return f"{document_prefix(planification_id)}{uuid.uuid4().hex}/{name}"
+
+
+def is_document_key(planification_id, key):
+    # Clé produite par document_key pour cette planification
+    pattern = re.escape(document_prefix(planification_id)) + r"[0-9a-f]{32}/[^/\\]+"
+    return isinstance(key, str) and re.fullmatch(pattern, key) is not None
+
+
+def upload_fileobj(file_object, key, content_type=None):
+    extra_args = {'ContentType': content_type} if content_type else None
+    get_s3_client().upload_fileobj(
+        file_object,
+        settings.AWS_STORAGE_BUCKET_NAME,
+        key,
+        ExtraArgs=extra_args,
+        Config=get_transfer_config()
+    )
+    return object_url(key)
+
+
+def put_fileobj(file_object, key, content_type=None):
+    # PUT simple (petits fichiers) : l'ETag de l'objet écrit est dans la réponse, sans HEAD
+    params = {'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key, 'Body': file_object}
+    if content_type:
+        params['ContentType'] = content_type
+    return get_s3_client().put_object(**params)['ETag']
+
+
+def delete_objects(keys):
+    if not keys:
+        return
+    get_s3_client().delete_objects(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Delete={'Objects': [{'Key': key} for key in keys], 'Quiet': True}
+    )
+
+
+def presigned_post(key, content_type, max_size, expires_in):
+    return get_s3_client().generate_presigned_post(
+        Bucket=settings.AWS_STORAGE_BUCKET_NAME,
+        Key=key,
+        Fields={'Content-Type': content_type},
+        Conditions=[
+            {'Content-Type': content_type},
+            ['content-length-range', 1, max_size],
+        ],
+        ExpiresIn=expires_in
+    )
+
+
+def object_etag(key):
+    # ETag actuel de l'objet, None s'il n'existe pas
+    try:
+        return get_s3_client().head_object(Bucket=settings.AWS_STORAGE_BUCKET_NAME, Key=key)['ETag']
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+            return None
+        raise
+
+
+def content_disposition(file_name):
+    # Nom ASCII échappé pour les anciens clients, nom exact en UTF-8 (RFC 5987) pour les autres
+    ascii_name = ''.join(c if ' ' <= c <= '~' else '_' for c in file_name)
+    ascii_name = ascii_name.replace('\\', '\\\\').replace('"', '\\"')
+    return f"attachment; filename=\"{ascii_name}\"; filename*=UTF-8''{quote(file_name, safe='')}"
+
+
+def presigned_get_url(key, file_name, expires_in):
+    return get_s3_client().generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': settings.AWS_STORAGE_BUCKET_NAME,
+            'Key': key,
+            'ResponseContentDisposition': content_disposition(file_name),
+        },
+        ExpiresIn=expires_in
+    )
+
+
+def get_object(key, range_header=None, if_none_match=None):
+    params = {'Bucket': settings.AWS_STORAGE_BUCKET_NAME, 'Key': key}
+    if range_header:
+        params['Range'] = range_header
+    if if_none_match:
+        params['IfNoneMatch'] = if_none_match
+    return get_s3_client().get_object(**params)
+
@@ -54,6 +54,33 @@ class PlanificationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Planification
         fields = ['id', 'date', 'controleur', 'employeur']
+
+
+# Colonnes lues par PlanificationSerializer, contrôleur et employeur compris
+PLANIFICATION_COLUMNS = (
+    'id', 'date',
+    'controleur__id', 'controleur__email', 'controleur__nom', 'controleur__prenom',
+    'employeur__id', 'employeur__nom', 'employeur__adresse',
+)
+
+
+def planification_queryset(queryset):
+    # Une seule requête (jointures) quel que soit le nombre de planifications
+    return queryset.select_related('controleur', 'employeur').only('controleur', 'employeur', *PLANIFICATION_COLUMNS)
+
+
+def planifications_flat(queryset):
+    # Même JSON que PlanificationSerializer, construit depuis values_list sans instancier les modèles
+    return [
+        {
+            'id': pk,
+            'date': jour.isoformat(),
+            'controleur': {'id': c_id, 'email': c_email, 'nom': c_nom, 'prenom': c_prenom},
+            'employeur': {'id': e_id, 'nom': e_nom, 'adresse': e_adresse},
+        }
+        for pk, jour, c_id, c_email, c_nom, c_prenom, e_id, e_nom, e_adresse
+        in queryset.values_list(*PLANIFICATION_COLUMNS)
+    ]
          
 
 class DocumentSerializer(serializers.ModelSerializer):
@@ -0,0 +1,114 @@
+# auth_app/signals.py
+
+"""Invalidation des données calendrier (ETag et cache) sur modification des modèles.
+
+pre_save mémorise les valeurs visibles dans les réponses ; post_save n'incrémente
+les versions que si l'une d'elles a changé (une connexion qui met à jour last_login
+ou un changement de mot de passe ne change rien au calendrier).
+"""
+
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import versions
+from .models import CustomUser, Employeur, JourConge, JourFerie, Planification
+
+# Champs sérialisés par les endpoints calendrier
+CHAMPS_UTILISATEUR = ('email', 'nom', 'prenom', 'role', 'centre_id')
+CHAMPS_PLANIFICATION = ('controleur_id', 'employeur_id', 'date')
+CHAMPS_EMPLOYEUR = ('nom', 'adresse')
+CHAMPS_CONGE = ('controleur_id', 'date')
+
+
+def valeurs(instance, champs):
+    return tuple(getattr(instance, champ) for champ in champs)
+
+
+def remember_previous(sender, instance, champs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = sender.objects.filter(pk=instance.pk).values_list(*champs).first()
+
+
+def changed(instance, champs):
+    return getattr(instance, '_previous', None) != valeurs(instance, champs)
+
+
+@receiver(pre_save, sender=CustomUser)
+def user_pre_save(sender, instance, **kwargs):
+    remember_previous(sender, instance, CHAMPS_UTILISATEUR)
+
+
+@receiver(post_save, sender=CustomUser)
+def user_post_save(sender, instance, **kwargs):
+    if changed(instance, CHAMPS_UTILISATEUR):
+        # L'ancien centre perd le contrôleur, le nouveau le gagne
+        ancien_centre = instance._previous[-1] if instance._previous else None
+        versions.bump(versions.CONTROLEUR, [instance.pk])
+        versions.bump(versions.CENTRE, [ancien_centre, instance.centre_id])
+        versions.bump(versions.CONGES, [ancien_centre, instance.centre_id])
+
+
+@receiver(post_delete, sender=CustomUser)
+def user_post_delete(sender, instance, **kwargs):
+    versions.bump(versions.CENTRE, [instance.centre_id])
+    versions.bump(versions.CONGES, [instance.centre_id])
+
+
+@receiver(pre_save, sender=Planification)
+def planification_pre_save(sender, instance, **kwargs):
+    remember_previous(sender, instance, CHAMPS_PLANIFICATION)
+
+
+@receiver(post_save, sender=Planification)
+def planification_post_save(sender, instance, **kwargs):
+    if changed(instance, CHAMPS_PLANIFICATION):
+        ancien_controleur = instance._previous[0] if instance._previous else None
+        versions.bump_controleurs([ancien_controleur, instance.controleur_id])
+
+
+@receiver(post_delete, sender=Planification)
+def planification_post_delete(sender, instance, **kwargs):
+    versions.bump_controleurs([instance.controleur_id])
+
+
+@receiver(pre_save, sender=Employeur)
+def employeur_pre_save(sender, instance, **kwargs):
+    remember_previous(sender, instance, CHAMPS_EMPLOYEUR)
+
+
+@receiver(post_save, sender=Employeur)
+def employeur_post_save(sender, instance, created, **kwargs):
+    # Le nom et l'adresse de l'employeur apparaissent dans les plannings de ses contrôleurs
+    if not created and changed(instance, CHAMPS_EMPLOYEUR):
+        versions.bump_controleurs(
+            Planification.objects.filter(employeur=instance).values_list('controleur_id', flat=True).distinct()
+        )
+
+
+@receiver(pre_save, sender=JourConge)
+def conge_pre_save(sender, instance, **kwargs):
+    remember_previous(sender, instance, CHAMPS_CONGE)
+
+
+def bump_conges(controleur_ids):
+    centres = CustomUser.objects.filter(id__in=controleur_ids).values_list('centre_id', flat=True)
+    versions.bump(versions.CONGES, centres)
+
+
+@receiver(post_save, sender=JourConge)
+def conge_post_save(sender, instance, **kwargs):
+    if changed(instance, CHAMPS_CONGE):
+        ancien_controleur = instance._previous[0] if instance._previous else None
+        bump_conges([ancien_controleur, instance.controleur_id])
+
+
+@receiver(post_delete, sender=JourConge)
+def conge_post_delete(sender, instance, **kwargs):
+    bump_conges([instance.controleur_id])
+
+
+@receiver(post_save, sender=JourFerie)
+@receiver(post_delete, sender=JourFerie)
+def jour_ferie_changed(sender, instance, **kwargs):
+    versions.bump(versions.FERIES, [versions.TOUS])
@@ -0,0 +1,197 @@
+# auth_app/tasks.py
+
+import logging
+import os
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from . import s3
+from .models import AnalysisJob, Document, DocumentText, Planification, SummaryReport
+from .utils import extract_text_from_fileobj, analyze_documents_with_openai, generate_summary_report, upload_report_to_s3
+
+logger = logging.getLogger(__name__)
+
+
+class AnalysisError(Exception):
+    pass
+
+
+def enqueue_analysis(planification):
+    # Un seul job en attente par planification : plusieurs uploads rapprochés ne déclenchent qu'une analyse.
+    # Le verrou sur la planification sérialise les uploads concurrents entre la lecture et la création.
+    with transaction.atomic():
+        Planification.objects.select_for_update().filter(pk=planification.pk).first()
+        job = AnalysisJob.objects.filter(planification=planification, status='pending').first()
+        if job:
+            return job
+        return AnalysisJob.objects.create(
+            planification=planification,
+            max_attempts=settings.ANALYSIS_JOB_MAX_ATTEMPTS,
+        )
+
+
+def register_documents(planification, uploads):
+    # uploads : liste de (url, extraction ou None), extraction = (texte, pages, hash, ETag S3) ;
+    # un seul INSERT pour tous les nouveaux documents
+    urls = [url for url, _ in uploads]
+    with transaction.atomic():
+        # Fichier remplacé à une URL déjà enregistrée : on garde le document mais son
+        # texte extrait ne correspond plus au contenu
+        by_url = {document.url: document for document in Document.objects.filter(planification=planification, url__in=urls)}
+        DocumentText.objects.filter(document__in=list(by_url.values())).delete()
+
+        created = Document.objects.bulk_create([Document(planification=planification, url=url) for url in urls if url not in by_url])
+        if any(document.pk is None for document in created):
+            # MySQL ne renvoie pas les clés générées par bulk_create : on relit les lignes insérées
+            for document in Document.objects.filter(planification=planification, url__in=urls).order_by('id'):
+                by_url[document.url] = document
+        else:
+            by_url.update((document.url, document) for document in created)
+        documents = [by_url[url] for url in urls]
+
+        document_texts = []
+        for document, (_, extracted) in zip(documents, uploads):
+            if extracted:
+                text, page_count, content_hash, source_etag = extracted
+                document_texts.append(DocumentText(
+                    document=document, text=text, page_count=page_count, content_hash=content_hash, source_etag=source_etag
+                ))
+        DocumentText.objects.bulk_create(document_texts)
+        job = enqueue_analysis(planification)
+    return documents, job
+
+
+def claim_next_job():
+    now = timezone.now()
+    stale = now - timedelta(seconds=settings.ANALYSIS_JOB_LOCK_TIMEOUT)
+    # Un worker qui meurt à chaque tentative (mémoire, timeout) ne doit pas boucler indéfiniment
+    AnalysisJob.objects.filter(status='running', locked_at__lt=stale, attempts__gte=F('max_attempts')).update(
+        status='failed', locked_at=None, last_error="Worker interrompu à chaque tentative", updated_at=now
+    )
+    with transaction.atomic():
+        # Les jobs "running" dont le worker a disparu sont repris après ANALYSIS_JOB_LOCK_TIMEOUT
+        job = (
+            AnalysisJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(
+                Q(status='pending', run_after__lte=now)
+                | Q(status='running', locked_at__lt=stale, attempts__lt=F('max_attempts'))
+            )
+            .order_by('run_after', 'id')
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = 'running'
+        job.locked_at = now
+        job.attempts += 1
+        job.save(update_fields=['status', 'locked_at', 'attempts', 'updated_at'])
+        return job
+
+
+def save_document_text(document, text, page_count, content_hash, source_etag=''):
+    values = {'text': text, 'page_count': page_count, 'content_hash': content_hash, 'source_etag': source_etag}
+    try:
+        with transaction.atomic():
+            return DocumentText.objects.update_or_create(document=document, defaults=values)[0]
+    except IntegrityError:
+        # Extraction concurrente déjà enregistrée
+        return DocumentText.objects.get(document=document)
+
+
+def get_document_text(document):
+    # Le texte n'est extrait qu'une fois par contenu, normalement dès l'upload. Un HEAD vérifie
+    # que l'objet S3 n'a pas été remplacé depuis (même nom) ; sinon on relit les octets actuels.
+    key = s3.key_from_url(document.url)
+    etag = s3.object_etag(key)
+    try:
+        document_text = document.extracted_text
+    except DocumentText.DoesNotExist:
+        document_text = None
+    if document_text and (etag is None or document_text.source_etag == etag):
+        return document_text
+
+    s3_object = s3.get_object(key)
+    document_text = save_document_text(document, *extract_text_from_fileobj(s3_object['Body']), source_etag=s3_object['ETag'])
+    logger.info(f"Document {document.id}: {document_text.page_count} pages, {len(document_text.text)} caractères extraits")
+    return document_text
+
+
+def run_analysis(planification):
+    # Extraction -> analyse -> rapport -> upload ; retourne le SummaryReport ou None s'il y a moins de 2 textes
+    documents = Document.objects.filter(planification=planification).select_related('extracted_text').order_by('id')
+    texts = []
+    for document in documents:
+        text = get_document_text(document).text
+        if text:
+            texts.append(text)
+
+    if len(texts) < 2:
+        logger.info(f"Planification {planification.id}: moins de 2 textes extraits, pas de rapport généré.")
+        return None
+
+    analysis = analyze_documents_with_openai(texts)
+    if analysis.get("error"):
+        raise AnalysisError(analysis["error"])
+
+    comparisons = {
+        "between": "tous les documents",
+        "summaries": analysis.get("summaries", []),
+        "convergences": analysis.get("convergences", []),
+        "divergences": analysis.get("divergences", [])
+    }
+
+    fd, temp_report_path = tempfile.mkstemp(prefix=f"summary_{planification.id}_", suffix=".pdf")
+    os.close(fd)
+    try:
+        generate_summary_report(comparisons, temp_report_path)
+        summary_url = upload_report_to_s3(temp_report_path, planification.id)
+    finally:
+        os.remove(temp_report_path)
+
+    report, _ = SummaryReport.objects.update_or_create(
+        planification=planification,
+        defaults={'report_url': summary_url}
+    )
+    logger.info(f"URL du rapport enregistrée pour la planification {planification.id}: {summary_url}")
+    return report
+
+
+def process_job(job):
+    try:
+        run_analysis(job.planification)
+    except Exception as e:
+        logger.error(f"Échec du job d'analyse {job.id} (tentative {job.attempts}/{job.max_attempts}): {str(e)}", exc_info=True)
+        job.last_error = str(e)
+        job.locked_at = None
+        if job.attempts < job.max_attempts:
+            # Backoff exponentiel entre les tentatives
+            delay = settings.ANALYSIS_JOB_RETRY_DELAY * (2 ** (job.attempts - 1))
+            job.status = 'pending'
+            job.run_after = timezone.now() + timedelta(seconds=delay)
+        else:
+            job.status = 'failed'
+        job.save(update_fields=['status', 'last_error', 'locked_at', 'run_after', 'updated_at'])
+        return False
+
+    job.status = 'done'
+    job.last_error = ''
+    job.locked_at = None
+    job.save(update_fields=['status', 'last_error', 'locked_at', 'updated_at'])
+    return True
+
+
+def run_pending_jobs(limit=None):
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        process_job(job)
+        processed += 1
+    return processed
@@ -1,3 +1,1211 @@
-from django.test import TestCase
+import asyncio
+import csv
+import hashlib
+import io
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import openai
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from . import analysis, importing, llm, metrics, planning, s3, tasks
+from .availability import Disponibilites
+from .management.commands.bench_planification import generer_donnees
+from .management.commands.import_employeurs import EmployeurImporter
+from .management.commands.planification import Command as PlanificationCommand
+from .models import AnalysisCacheEntry, AnalysisJob, Centre, CustomUser, Document, DocumentText, Employeur, JourConge, JourFerie, Planification, PlanificationRun, PlanningVersion, SummaryReport
+
+
+class WordEncoding:
+    # Tokenizer de test : un mot = un token (évite le téléchargement des tables tiktoken)
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+
+class StubOpenAIHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        prompt = body['messages'][-1]['content']
+
+        with self.server.lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+            failure = self.server.failures.pop(0) if self.server.failures else None
+        try:
+            time.sleep(self.server.delay)
+        finally:
+            with self.server.lock:
+                self.server.in_flight -= 1
+
+        if failure:
+            self.reply(failure, {"error": {"message": "stub failure", "type": "server_error"}})
+            return
+
+        self.server.prompts.append(prompt)
+
+        if prompt.startswith("Tu es un expert comptable"):
+            document_count = prompt.count("=== DOCUMENT")
+            content = {
+                "summaries": [f"document {i}" for i in range(1, document_count + 1)],
+                "convergences": ["même exercice"],
+                "divergences": ["chiffre d'affaires"],
+            }
+        else:
+            content = {"summary": f"résumé {len(self.server.prompts)}"}
+
+        self.reply(200, {
+            "id": "chatcmpl-test",
+            "object": "chat.completion",
+            "created": 0,
+            "model": body['model'],
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": json.dumps(content)}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+        })
+
+    def reply(self, code, body):
+        payload = json.dumps(body).encode()
+        try:
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client parti sur timeout (test_slow_calls_time_out) : rien à répondre
+            pass
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_server(test):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubOpenAIHandler)
+    server.prompts = []
+    server.failures = []  # codes HTTP à renvoyer avant de répondre normalement
+    server.delay = 0
+    server.lock = threading.Lock()
+    server.in_flight = 0
+    server.max_in_flight = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    test.addCleanup(server.server_close)
+    test.addCleanup(server.shutdown)
+    return server
+
+
+class StubS3Client:
+    # Bucket en mémoire : clé -> (contenu, ETag)
+    def __init__(self):
+        self.objects = {}
+        self.deleted = []
+        self.fail_names = set()  # noms de fichiers dont l'upload échoue
+
+    def error(self, code):
+        return ClientError({'Error': {'Code': code}}, 'stub')
+
+    def put(self, key, content):
+        self.objects[key] = (content, f'"{hashlib.md5(content).hexdigest()}"')
+
+    def upload_fileobj(self, file_object, bucket, key, ExtraArgs=None, Config=None):
+        if key.rsplit('/', 1)[-1] in self.fail_names:
+            raise self.error('InternalError')
+        self.put(key, file_object.read())
+
+    def put_object(self, Bucket, Key, Body, ContentType=None):
+        self.upload_fileobj(Body, Bucket, Key)
+        return {'ETag': self.objects[Key][1]}
+
+    def head_object(self, Bucket, Key):
+        if Key not in self.objects:
+            raise self.error('404')
+        return {'ETag': self.objects[Key][1], 'ContentLength': len(self.objects[Key][0])}
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None):
+        if Key not in self.objects:
+            raise self.error('NoSuchKey')
+        content, etag = self.objects[Key]
+        if IfNoneMatch == etag:
+            raise self.error('304')
+        result = {'ETag': etag, 'ContentType': 'application/pdf'}
+        if Range:
+            debut, fin = (int(v) for v in Range.removeprefix('bytes=').split('-'))
+            result['ContentRange'] = f"bytes {debut}-{fin}/{len(content)}"
+            content = content[debut:fin + 1]
+        result.update(Body=io.BytesIO(content), ContentLength=len(content))
+        return result
+
+    def delete_objects(self, Bucket, Delete):
+        for obj in Delete['Objects']:
+            self.deleted.append(obj['Key'])
+            self.objects.pop(obj['Key'], None)
+
+    def generate_presigned_post(self, Bucket, Key, Fields, Conditions, ExpiresIn):
+        self.conditions = Conditions
+        return {'url': f"https://{Bucket}.s3.test/", 'fields': {'key': Key, **Fields}}
+
+    def generate_presigned_url(self, method, Params, ExpiresIn):
+        self.params = Params
+        return f"https://{Params['Bucket']}.s3.test/{Params['Key']}?expires={ExpiresIn}"
+
+
+def stub_s3(test):
+    client = StubS3Client()
+    patcher = mock.patch.object(s3, 'get_s3_client', return_value=client)
+    patcher.start()
+    test.addCleanup(patcher.stop)
+    return client
+
+
+def fake_extract(file_object):
+    # Texte = contenu du fichier (évite de fabriquer des PDF)
+    content = file_object.read()
+    return content.decode(), 1, hashlib.sha256(content).hexdigest()
+
+
+class MapReduceAnalysisTests(TestCase):
+    def setUp(self):
+        self.server = start_stub_server(self)
+
+        settings_override = override_settings(
+            OPENAI_API_KEY='test',
+            OPENAI_BASE_URL=f"http://127.0.0.1:{self.server.server_port}/v1",
+            OPENAI_SEGMENT_TOKENS=10,
+            OPENAI_CONTEXT_TOKENS=4000,
+            OPENAI_REDUCE_MAX_TOKENS=100,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        patcher = mock.patch.object(analysis, 'get_encoding', return_value=WordEncoding())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        llm.reset_gateway()
+        self.addCleanup(llm.reset_gateway)
+
+    def test_every_segment_is_analysed(self):
+        first = " ".join(f"a{i}" for i in range(25))
+        second = " ".join(f"b{i}" for i in range(7))
+
+        result = analysis.analyze_documents([first, second])
+
+        map_prompts = [p for p in self.server.prompts if "Extrait :" in p]
+        self.assertEqual(len(map_prompts), 4)  # 3 segments + 1 segment
+        analysed_words = set(" ".join(map_prompts).split())
+        self.assertTrue(set(first.split()) <= analysed_words)
+        self.assertTrue(set(second.split()) <= analysed_words)
+
+        self.assertEqual(result["summaries"], ["document 1", "document 2"])
+        self.assertEqual(result["convergences"], ["même exercice"])
+        self.assertEqual(result["divergences"], ["chiffre d'affaires"])
+
+    def test_summaries_are_collapsed_to_fit_the_budget(self):
+        text = " ".join(f"a{i}" for i in range(80))  # 8 segments
+        budget = analysis.reduce_budget()
+
+        with override_settings(OPENAI_CONTEXT_TOKENS=4000 - budget + 10):
+            analysis.analyze_documents([text])
+
+        combine_prompts = [p for p in self.server.prompts if "Résumés partiels" in p]
+        self.assertTrue(combine_prompts)
+        reduce_prompt = self.server.prompts[-1]
+        self.assertTrue(reduce_prompt.startswith("Tu es un expert comptable"))
+
+    def test_collapse_merges_other_documents_when_the_largest_is_single(self):
+        # Le document le plus long n'a qu'un résumé : on réduit l'autre document
+        long_document = [" ".join(f"l{i}" for i in range(30))]
+        autre = [" ".join(f"p{j}{i}" for i in range(5)) for j in range(4)]
+        budget = analysis.count_tokens(analysis.format_document_summaries([long_document, ["résumé 1"]]))
+
+        collapsed = analysis.collapse([long_document, autre], budget)
+
+        self.assertEqual(collapsed[0], long_document)
+        self.assertEqual(len(collapsed[1]), 1)
+        with self.assertRaises(ValueError):
+            analysis.collapse([long_document, ["court"]], budget - 5)
+
+    def test_cached_segments_are_not_sent_again(self):
+        first = " ".join(f"a{i}" for i in range(20))
+        analysis.analyze_documents([first])
+        self.assertEqual(AnalysisCacheEntry.objects.count(), 2)
+
+        self.server.prompts.clear()
+        second = " ".join(f"b{i}" for i in range(10))
+        analysis.analyze_documents([first, second])
+
+        map_prompts = [p for p in self.server.prompts if "Extrait :" in p]
+        self.assertEqual(len(map_prompts), 1)
+        self.assertIn("b0", map_prompts[0])
+        counters = metrics.snapshot()
+        self.assertEqual(counters['analysis_cache.hits'], 2)
+        self.assertEqual(counters['analysis_cache.misses'], 3)
+
+    def test_successful_segments_are_cached_when_one_fails(self):
+        text = " ".join(f"a{i}" for i in range(30))  # 3 segments
+        self.server.failures = [400]  # erreur définitive pour un des segments
+
+        with self.assertRaises(openai.BadRequestError):
+            analysis.analyze_documents([text])
+        self.assertEqual(AnalysisCacheEntry.objects.count(), 2)
+
+        # Nouvelle tentative : seul le segment manquant est renvoyé à l'API
+        self.server.prompts.clear()
+        analysis.analyze_documents([text])
+        self.assertEqual(len([p for p in self.server.prompts if "Extrait :" in p]), 1)
+
+    @override_settings(ANALYSIS_CACHE_MAX_ENTRIES=1)
+    def test_eviction_keeps_most_recently_used_entries(self):
+        analysis.analyze_documents([" ".join(f"a{i}" for i in range(20))])
+
+        self.assertEqual(analysis.evict_cache(), 1)
+        self.assertEqual(AnalysisCacheEntry.objects.count(), 1)
+
+
+class LLMGatewayTests(TestCase):
+    def setUp(self):
+        self.server = start_stub_server(self)
+        settings_override = override_settings(
+            OPENAI_API_KEY='test',
+            OPENAI_BASE_URL=f"http://127.0.0.1:{self.server.server_port}/v1",
+            OPENAI_MAX_CONCURRENCY=2,
+            OPENAI_RATE_LIMIT_RPS=0,
+            OPENAI_MAX_RETRIES=3,
+            OPENAI_BACKOFF_BASE=0.01,
+            OPENAI_BACKOFF_MAX=0.05,
+            OPENAI_TIMEOUT=2,
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        llm.reset_gateway()
+        self.addCleanup(llm.reset_gateway)
+
+    def chat(self, count=1):
+        gateway = llm.get_gateway()
+
+        async def calls():
+            return await asyncio.gather(*(
+                gateway.chat_completion(model='test', messages=[{"role": "user", "content": f"Extrait :\n{i}"}])
+                for i in range(count)
+            ))
+
+        return gateway.run(calls())
+
+    def test_retries_rate_limit_and_server_errors(self):
+        self.server.failures = [429, 500, 503]
+
+        responses = self.chat()
+
+        self.assertEqual(len(responses), 1)
+        self.assertEqual(self.server.failures, [])
+
+    def test_gives_up_after_max_retries(self):
+        self.server.failures = [500] * 4
+
+        with self.assertRaises(openai.InternalServerError):
+            self.chat()
+
+    def test_client_errors_are_not_retried(self):
+        self.server.failures = [400, 400]
+
+        with self.assertRaises(openai.BadRequestError):
+            self.chat()
+        self.assertEqual(self.server.failures, [400])
+
+    def test_concurrency_is_bounded(self):
+        self.server.delay = 0.05
+
+        self.chat(count=8)
+
+        self.assertEqual(len(self.server.prompts), 8)
+        self.assertLessEqual(self.server.max_in_flight, 2)
+
+    @override_settings(OPENAI_TIMEOUT=0.2, OPENAI_MAX_RETRIES=1)
+    def test_slow_calls_time_out(self):
+        llm.reset_gateway()
+        self.server.delay = 1
+
+        with self.assertRaises((asyncio.TimeoutError, openai.APITimeoutError)):
+            self.chat()
+
+    def test_token_bucket_limits_rate(self):
+        bucket = llm.TokenBucket(rate=20, capacity=1)
+
+        async def acquire_many():
+            for _ in range(5):
+                await bucket.acquire()
+
+        start = time.monotonic()
+        asyncio.run(acquire_many())
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+
+@override_settings(ANALYSIS_JOB_MAX_ATTEMPTS=2, ANALYSIS_JOB_RETRY_DELAY=30, ANALYSIS_JOB_LOCK_TIMEOUT=600)
+class AnalysisJobTests(TestCase):
+    def setUp(self):
+        centre = Centre.objects.create(nom="Centre")
+        self.controleur = CustomUser.objects.create_user("c@test.fr", "pw", role='controleur', centre=centre)
+        employeur = Employeur.objects.create(nom="E", adresse="a", ville="v", centre=centre, telephone="1")
+        self.planif = Planification.objects.create(controleur=self.controleur, employeur=employeur, date=date(2025, 3, 3))
+
+    def test_pending_job_is_shared_and_claimed_once(self):
+        job = tasks.enqueue_analysis(self.planif)
+        self.assertEqual(tasks.enqueue_analysis(self.planif), job)
+        claimed = tasks.claim_next_job()
+        self.assertEqual((claimed.id, claimed.status, claimed.attempts), (job.id, 'running', 1))
+        self.assertIsNone(tasks.claim_next_job())
+
+    def test_failures_back_off_then_fail(self):
+        job = tasks.enqueue_analysis(self.planif)
+        with mock.patch.object(tasks, 'run_analysis', side_effect=RuntimeError("boom")):
+            self.assertFalse(tasks.process_job(tasks.claim_next_job()))
+            job.refresh_from_db()
+            self.assertEqual((job.status, job.last_error), ('pending', "boom"))
+            self.assertGreater(job.run_after, timezone.now() + timedelta(seconds=25))
+            self.assertIsNone(tasks.claim_next_job())  # pas avant la fin du backoff
+
+            AnalysisJob.objects.filter(pk=job.pk).update(run_after=timezone.now())
+            self.assertFalse(tasks.process_job(tasks.claim_next_job()))
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), ('failed', 2))
+
+    def test_stale_running_job_is_reclaimed_until_attempts_run_out(self):
+        job = tasks.enqueue_analysis(self.planif)
+        tasks.claim_next_job()
+        # Worker disparu : le verrou expire
+        AnalysisJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=601))
+        self.assertEqual(tasks.claim_next_job().attempts, 2)
+
+        AnalysisJob.objects.filter(pk=job.pk).update(locked_at=timezone.now() - timedelta(seconds=601))
+        self.assertIsNone(tasks.claim_next_job())
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'failed')
+
+    def test_status_view_permissions(self):
+        tasks.enqueue_analysis(self.planif)
+        url = f'/api/planifications/{self.planif.id}/analysis/'
+        autre_centre = Centre.objects.create(nom="Autre")
+        users = {
+            'controleur': (self.controleur, 200),
+            'autre_controleur': (CustomUser.objects.create_user("c2@test.fr", "pw", role='controleur', centre=self.controleur.centre), 403),
+            'superviseur': (CustomUser.objects.create_user("s@test.fr", "pw", role='superviseur', centre=self.controleur.centre), 200),
+            'superviseur_autre_centre': (CustomUser.objects.create_user("s2@test.fr", "pw", role='superviseur', centre=autre_centre), 403),
+        }
+        client = APIClient()
+        for nom, (user, attendu) in users.items():
+            client.force_authenticate(user)
+            response = client.get(url)
+            self.assertEqual(response.status_code, attendu, nom)
+        client.force_authenticate(self.controleur)
+        self.assertEqual(client.get(url).json()['status'], 'pending')
+        client.force_authenticate(None)
+        self.assertEqual(client.get(url).status_code, 401)
+
+
+class DocumentTextTests(TestCase):
+    def setUp(self):
+        self.s3 = stub_s3(self)
+        patcher = mock.patch.object(tasks, 'extract_text_from_fileobj', side_effect=fake_extract)
+        self.extract = patcher.start()
+        self.addCleanup(patcher.stop)
+        centre = Centre.objects.create(nom="Centre")
+        controleur = CustomUser.objects.create_user("c@test.fr", "pw", role='controleur', centre=centre)
+        employeur = Employeur.objects.create(nom="E", adresse="a", ville="v", centre=centre, telephone="1")
+        self.planif = Planification.objects.create(controleur=controleur, employeur=employeur, date=date(2025, 3, 3))
+        self.key = s3.document_key(self.planif.id, "releve.pdf")
+        self.url = s3.object_url(self.key)
+
+    def test_text_is_extracted_once_per_content(self):
+        self.s3.put(self.key, b"version 1")
+        document, = tasks.register_documents(self.planif, [(self.url, None)])[0]
+        self.assertEqual(tasks.get_document_text(document).text, "version 1")
+        document = Document.objects.select_related('extracted_text').get(pk=document.pk)
+        self.assertEqual(tasks.get_document_text(document).text, "version 1")
+        self.assertEqual(self.extract.call_count, 1)
+
+    def test_replaced_object_is_extracted_again(self):
+        self.s3.put(self.key, b"version 1")
+        extraction = (*fake_extract(io.BytesIO(b"version 1")), self.s3.objects[self.key][1])
+        document, = tasks.register_documents(self.planif, [(self.url, extraction)])[0]
+
+        # Même nom, nouveau contenu
+        self.s3.put(self.key, b"version 2")
+        document = Document.objects.select_related('extracted_text').get(pk=document.pk)
+        self.assertEqual(tasks.get_document_text(document).text, "version 2")
+        self.assertEqual(DocumentText.objects.get(document=document).source_etag, self.s3.objects[self.key][1])
+
+    def test_registering_the_same_url_again_drops_the_old_text(self):
+        self.s3.put(self.key, b"version 1")
+        extraction = (*fake_extract(io.BytesIO(b"version 1")), self.s3.objects[self.key][1])
+        document, = tasks.register_documents(self.planif, [(self.url, extraction)])[0]
+        again, = tasks.register_documents(self.planif, [(self.url, None)])[0]
+        self.assertEqual(again.pk, document.pk)
+        self.assertEqual(Document.objects.count(), 1)
+        self.assertFalse(DocumentText.objects.exists())
+
+
+@override_settings(DOCUMENT_UPLOAD_WORKERS=1)
+class DocumentUploadTests(TestCase):
+    def setUp(self):
+        self.s3 = stub_s3(self)
+        centre = Centre.objects.create(nom="Centre")
+        self.controleur = CustomUser.objects.create_user("c@test.fr", "pw", role='controleur', centre=centre)
+        employeur = Employeur.objects.create(nom="E", adresse="a", ville="v", centre=centre, telephone="1")
+        self.planif = Planification.objects.create(controleur=self.controleur, employeur=employeur, date=date(2025, 3, 3))
+        self.client = APIClient()
+        self.client.force_authenticate(self.controleur)
+
+    def upload(self, *names):
+        files = {f"f{i}": SimpleUploadedFile(name, name.encode(), content_type='application/pdf') for i, name in enumerate(names)}
+        return self.client.post('/api/upload-documents/', {'planification_id': self.planif.id, **files}, format='multipart')
+
+    def test_same_basename_gets_distinct_keys(self):
+        response = self.upload("releve.pdf", "releve.pdf")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(len(set(response.json()['urls'])), 2)
+        self.assertEqual(Document.objects.count(), 2)
+        self.assertEqual(len(self.s3.objects), 2)
+
+    def test_small_files_are_extracted_inline_without_extra_round_trip(self):
+        with mock.patch('auth_app.views.extract_text_from_fileobj', side_effect=fake_extract), \
+                mock.patch.object(self.s3, 'head_object') as head_object:
+            self.assertEqual(self.upload("releve.pdf").status_code, 202)
+        head_object.assert_not_called()
+        document_text = DocumentText.objects.get()
+        self.assertEqual(document_text.text, "releve.pdf")
+        self.assertEqual(document_text.source_etag, next(iter(self.s3.objects.values()))[1])
+
+    @override_settings(DOCUMENT_INLINE_EXTRACT_MAX_SIZE=4)
+    def test_large_files_are_left_to_the_worker(self):
+        with mock.patch('auth_app.views.extract_text_from_fileobj') as extract:
+            self.assertEqual(self.upload("releve.pdf").status_code, 202)
+        extract.assert_not_called()
+        self.assertEqual(len(self.s3.objects), 1)
+        self.assertFalse(DocumentText.objects.exists())
+        self.assertEqual(AnalysisJob.objects.get().status, 'pending')
+
+    def test_failed_upload_only_removes_this_request_objects(self):
+        self.upload("releve.pdf")
+        anciens = dict(self.s3.objects)
+
+        self.s3.fail_names.add("bilan.pdf")
+        response = self.upload("releve.pdf", "bilan.pdf")
+        self.assertEqual(response.status_code, 500)
+        # Le relevé enregistré avant est intact, le nouveau relevé envoyé par cette requête est retiré
+        self.assertEqual(self.s3.objects, anciens)
+        self.assertEqual(len(self.s3.deleted), 1)
+        self.assertNotIn(self.s3.deleted[0], anciens)
+        self.assertEqual(Document.objects.count(), 1)
+
+    def test_failed_registration_only_removes_this_request_objects(self):
+        self.upload("releve.pdf")
+        anciens = dict(self.s3.objects)
+        with mock.patch('auth_app.views.register_documents', side_effect=RuntimeError("base indisponible")):
+            response = self.upload("releve.pdf")
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.s3.objects, anciens)
+
+    def presign(self, *files):
+        return self.client.post('/api/upload-documents/presign/', {'planification_id': self.planif.id, 'files': list(files)}, format='json')
+
+    def complete(self, *keys):
+        return self.client.post('/api/upload-documents/complete/', {'planification_id': self.planif.id, 'keys': list(keys)}, format='json')
+
+    def test_presign_keys_are_scoped_to_the_planification(self):
+        response = self.presign({'name': "releve.pdf", 'content_type': 'application/pdf'}, {'name': "releve.pdf"})
+        self.assertEqual(response.status_code, 200)
+        keys = [upload['key'] for upload in response.json()['uploads']]
+        self.assertEqual(len(set(keys)), 2)
+        for key in keys:
+            self.assertTrue(s3.is_document_key(self.planif.id, key))
+        # La politique signée impose le type annoncé et la taille maximale
+        self.assertIn({'Content-Type': 'application/octet-stream'}, self.s3.conditions)
+        self.assertIn(['content-length-range', 1, settings.DOCUMENT_MAX_UPLOAD_SIZE], self.s3.conditions)
+
+    def test_presign_rejects_oversized_file_and_foreign_planification(self):
+        response = self.presign({'name': "gros.pdf", 'size': settings.DOCUMENT_MAX_UPLOAD_SIZE + 1})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.presign({'content_type': 'application/pdf'}).status_code, 400)
+
+        autre = CustomUser.objects.create_user("autre@test.fr", "pw", role='controleur', centre=self.controleur.centre)
+        self.client.force_authenticate(autre)
+        self.assertEqual(self.presign({'name': "releve.pdf"}).status_code, 404)
+
+    def test_complete_rejects_foreign_key_and_missing_object(self):
+        autre_cle = s3.document_key(self.planif.id + 1, "releve.pdf")
+        self.s3.put(autre_cle, b"pdf")
+        self.assertEqual(self.complete(autre_cle).status_code, 400)
+        self.assertEqual(self.complete(f"{s3.document_prefix(self.planif.id)}../releve.pdf").status_code, 400)
+
+        # Clé valide mais fichier jamais envoyé
+        self.assertEqual(self.complete(s3.document_key(self.planif.id, "releve.pdf")).status_code, 400)
+        self.assertEqual(Document.objects.count(), 0)
+        self.assertEqual(AnalysisJob.objects.count(), 0)
+
+    def test_complete_reanalyses_replaced_object(self):
+        key = s3.document_key(self.planif.id, "releve.pdf")
+        self.s3.put(key, b"version 1")
+        response = self.complete(key)
+        self.assertEqual(response.status_code, 202)
+        document = Document.objects.get()
+        tasks.save_document_text(document, "version 1", 1, "h1", self.s3.objects[key][1])
+        AnalysisJob.objects.update(status='done')
+
+        # Même contenu : rien à refaire
+        self.assertEqual(self.complete(key).status_code, 200)
+        self.assertEqual(AnalysisJob.objects.count(), 1)
+
+        # Fichier remplacé à la même clé : texte périmé supprimé et nouvelle analyse
+        self.s3.put(key, b"version 2")
+        response = self.complete(key)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(Document.objects.count(), 1)
+        self.assertFalse(DocumentText.objects.exists())
+        self.assertEqual(AnalysisJob.objects.filter(status='pending').count(), 1)
+
+
+class DocumentDownloadTests(TestCase):
+    def setUp(self):
+        self.s3 = stub_s3(self)
+        centre = Centre.objects.create(nom="Centre")
+        controleur = CustomUser.objects.create_user("c@test.fr", "pw", role='controleur', centre=centre)
+        employeur = Employeur.objects.create(nom="E", adresse="a", ville="v", centre=centre, telephone="1")
+        planif = Planification.objects.create(controleur=controleur, employeur=employeur, date=date(2025, 3, 3))
+        self.key = s3.document_key(planif.id, "releve.pdf")
+        self.s3.put(self.key, b"0123456789")
+        self.document = Document.objects.create(planification=planif, url=s3.object_url(self.key))
+        self.url = f'/api/documents/{self.document.id}/download/'
+        self.client = APIClient()
+        self.client.force_authenticate(CustomUser.objects.create_user("s@test.fr", "pw", role='superviseur', centre=centre))
+
+    def test_proxy_streams_whole_file(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response['ETag'], self.s3.objects[self.key][1])
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+
+    def test_proxy_forwards_range(self):
+        response = self.client.get(self.url, HTTP_RANGE='bytes=2-4')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"234")
+        self.assertEqual(response['Content-Range'], 'bytes 2-4/10')
+
+    def test_not_modified_is_decided_by_s3(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Fichier réécrit à la même clé (rapport régénéré) : nouveau contenu, pas de 304 périmé
+        self.s3.put(self.key, b"nouveau")
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"nouveau")
+
+    def test_redirect_mode_returns_signed_url(self):
+        response = self.client.get(self.url, {'mode': 'redirect'})
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith(f"https://{settings.AWS_STORAGE_BUCKET_NAME}.s3.test/{self.key}"))
+
+    def test_redirect_escapes_file_name(self):
+        self.assertEqual(
+            s3.content_disposition('relevé "mars";.pdf'),
+            'attachment; filename="relev_ \\"mars\\";.pdf"; filename*=UTF-8\'\'relev%C3%A9%20%22mars%22%3B.pdf',
+        )
+        self.client.get(self.url, {'mode': 'redirect'})
+        self.assertEqual(self.s3.params['ResponseContentDisposition'], s3.content_disposition("releve.pdf"))
+
+    def test_missing_object(self):
+        del self.s3.objects[self.key]
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+
+class PlanificationParCentreTests(SimpleTestCase):
+    def setUp(self):
+        jours_valides, employeurs, controleurs, conges = generer_donnees(600, 15, 3, random.Random(0))
+        self.conges = conges
+        self.probleme = planning.Probleme(jours_valides, employeurs, controleurs, conges)
+        self.centres = dict(controleurs)
+        self.centres_employeurs = {e: centre for e, centre, _ in employeurs}
+
+    def test_reproducible_whatever_the_number_of_workers(self):
+        sequentiel = planning.planifier_par_centre(self.probleme, workers=1, seed=42)
+        parallele = planning.planifier_par_centre(self.probleme, workers=3, seed=42)
+        self.assertEqual(sorted(sequentiel), sorted(parallele))
+
+    def test_constraints_are_respected(self):
+        affectations = planning.planifier_par_centre(self.probleme, workers=1, seed=1)
+        self.assertEqual(len(affectations), 600)
+        semaines = set()
+        for controleur_id, employeur_id, jour in affectations:
+            self.assertEqual(self.centres[controleur_id], self.centres_employeurs[employeur_id])
+            self.assertNotIn(jour, self.conges[controleur_id])
+            semaines.add((controleur_id, jour.isocalendar()[:2]))
+        self.assertEqual(len(semaines), len(affectations))
+
+    def test_flow_engine_respects_constraints_and_favours_high_scores(self):
+        affectations = planning.planifier_par_centre(self.probleme, workers=1, seed=1, moteur='flow')
+        semaines = set()
+        for controleur_id, employeur_id, jour in affectations:
+            self.assertEqual(self.centres[controleur_id], self.centres_employeurs[employeur_id])
+            self.assertNotIn(jour, self.conges[controleur_id])
+            semaines.add((controleur_id, jour.isocalendar()[:2]))
+        self.assertEqual(len(semaines), len(affectations))
+
+        flot = planning.indicateurs(self.probleme, affectations)
+        glouton = planning.indicateurs(self.probleme, planning.planifier(self.probleme, random.Random(1)))
+        self.assertEqual(flot['planifies'], glouton['planifies'])
+        self.assertLess(flot['semaine_moyenne_ponderee'], glouton['semaine_moyenne_ponderee'])
+        self.assertLessEqual(flot['ecart_charge'], glouton['ecart_charge'])
+
+
+class DisponibilitesTests(SimpleTestCase):
+    def setUp(self):
+        # Semaine du lundi 6 au vendredi 10 janvier 2025, mercredi 8 férié
+        jours = [date(2025, 1, d) for d in (6, 7, 9, 10, 13, 14, 15, 16, 17)]
+        conges = {1: {date(2025, 1, 6), date(2025, 1, 7)}}
+        self.dispo = Disponibilites(jours, [1, 2, 3], conges, planifs_existantes=[(3, date(2025, 1, 14))])
+
+    def test_matrix_marks_holidays_leave_and_planned_weeks(self):
+        self.assertEqual(self.dispo.libre.shape, (3, 10))
+        self.assertEqual(self.dispo.semaines_libres().tolist(), [[True, True], [True, True], [True, False]])
+        self.assertEqual(self.dispo.premiers_jours_libres(0).tolist(), [3, 0, 0])
+        self.assertIsNone(self.dispo.premier_jour_libre(3, 1))
+
+    def test_vectorised_and_single_queries_agree(self):
+        jours_attribution = [5, 0, 9, 1, 4, 0, 0]
+        self.assertEqual(self.dispo.jours_les_moins_charges(0, jours_attribution).tolist(), [3, 1, 1])
+        self.assertEqual(self.dispo.jour_le_moins_charge(1, 0, jours_attribution), date(2025, 1, 9))
+        self.assertEqual(self.dispo.jour_le_moins_charge(2, 0, jours_attribution), date(2025, 1, 7))
+        self.assertIsNone(self.dispo.jour_le_moins_charge(3, 1, jours_attribution))
+
+
+class ReplanificationIncrementaleTests(TestCase):
+    def setUp(self):
+        centre = Centre.objects.create(nom="Centre")
+        self.controleurs = [
+            CustomUser.objects.create_user(f"c{i}@test.fr", "pw", role='controleur', centre=centre) for i in range(2)
+        ]
+        Employeur.objects.bulk_create([
+            Employeur(nom=f"E{i}", adresse="a", ville="v", centre=centre, telephone="1", score=i) for i in range(4)
+        ])
+        call_command('planification', seed=1, stdout=io.StringIO())
+
+    def test_only_conflicting_assignments_are_moved(self):
+        avant = dict(Planification.objects.values_list('id', 'date'))
+        conflit = Planification.objects.order_by('date').first()
+        JourConge.objects.create(controleur_id=conflit.controleur_id, date=conflit.date)
+
+        call_command('planification', incremental=True, seed=1, stdout=io.StringIO())
+
+        apres = dict(Planification.objects.values_list('id', 'date'))
+        self.assertEqual([pid for pid in avant if avant[pid] != apres[pid]], [conflit.id])
+        run = PlanificationRun.objects.get(mode='incremental')
+        self.assertEqual(run.moved_count, 1)
+        self.assertEqual(run.diff[0]["avant"]["date"], conflit.date.isoformat())
+
+    def test_edited_leave_date_is_replanned(self):
+        conflit = Planification.objects.order_by('date').first()
+        # Congé saisi avant la dernière exécution, puis corrigé sur un jour planifié
+        conge = JourConge.objects.create(controleur_id=conflit.controleur_id, date=date(2000, 1, 1))
+        ancien = PlanificationRun.objects.latest('started_at').started_at - timedelta(days=1)
+        JourConge.objects.filter(pk=conge.pk).update(created_at=ancien, updated_at=ancien)
+        conge.refresh_from_db()
+        conge.date = conflit.date
+        conge.save()
+
+        call_command('planification', incremental=True, seed=1, stdout=io.StringIO())
+
+        conflit.refresh_from_db()
+        self.assertNotEqual(conflit.date, conge.date)
+        self.assertEqual(PlanificationRun.objects.get(mode='incremental').moved_count, 1)
+
+    def test_compute_runs_outside_the_write_transaction(self):
+        Planification.objects.all().delete()
+        profondeur = len(connection.atomic_blocks)
+        calculer = PlanificationCommand.calculer
+        pendant_calcul = []
+
+        def calculer_et_noter(command, *args):
+            pendant_calcul.append(len(connection.atomic_blocks))
+            return calculer(command, *args)
+
+        with mock.patch.object(PlanificationCommand, 'calculer', autospec=True, side_effect=calculer_et_noter):
+            call_command('planification', seed=1, stdout=io.StringIO())
+        # Pas de transaction ouverte par la commande pendant le calcul (ni donc au fork du pool --workers)
+        self.assertEqual(pendant_calcul, [profondeur])
+        self.assertEqual(PlanificationRun.objects.latest('started_at').created_count, Planification.objects.count())
+
+    def test_nothing_moves_without_changes(self):
+        avant = list(Planification.objects.values_list('id', 'controleur_id', 'date'))
+        JourFerie.objects.create(nom="Passé", date=date(2000, 1, 1))
+        call_command('planification', incremental=True, stdout=io.StringIO())
+        self.assertEqual(list(Planification.objects.values_list('id', 'controleur_id', 'date')), avant)
+
+
+def full_scans(sql, params):
+    # Tables parcourues entièrement d'après le plan d'exécution (SQLite et MySQL uniquement)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            return [row[3] for row in cursor.fetchall() if row[3].startswith('SCAN ')]
+        cursor.execute(f"EXPLAIN {sql}", params)
+        colonnes = [c[0] for c in cursor.description]
+        return [row for row in (dict(zip(colonnes, r)) for r in cursor.fetchall()) if row['type'] == 'ALL']
+
+
+class QueryPlanTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        if connection.vendor not in ('sqlite', 'mysql'):
+            self.skipTest("EXPLAIN non interprété pour cette base")
+        centre = Centre.objects.create(nom="Centre")
+        self.superviseur = CustomUser.objects.create_user("s@test.fr", "pw", role='superviseur', centre=centre)
+        self.controleur = CustomUser.objects.create_user("c@test.fr", "pw", role='controleur', centre=centre)
+        employeurs = Employeur.objects.bulk_create([
+            Employeur(nom=f"E{i}", adresse="a", ville="v", centre=centre, telephone="1", score=i) for i in range(3)
+        ])
+        self.planifications = [
+            Planification.objects.create(controleur=self.controleur, employeur=e, date=date(2025, 3, 3 + i))
+            for i, e in enumerate(employeurs)
+        ]
+        Document.objects.create(planification=self.planifications[0], url="https://example.com/d.pdf")
+
+    def assert_no_full_scan(self, user, url):
+        client = APIClient()
+        client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        for query in ctx.captured_queries:
+            sql = query['sql']
+            if sql.startswith('SELECT'):
+                # Les paramètres sont déjà interpolés dans le SQL capturé
+                self.assertEqual(full_scans(sql, ()), [], sql)
+
+    def test_controller_endpoints_use_indexes(self):
+        planif = self.planifications[0]
+        self.assert_no_full_scan(self.controleur, '/api/planifications/')
+        self.assert_no_full_scan(self.controleur, f'/api/planifications/{planif.id}/')
+
+    def test_supervisor_endpoints_use_indexes(self):
+        planif = self.planifications[0]
+        self.assert_no_full_scan(self.superviseur, '/api/calendar/')
+        self.assert_no_full_scan(self.superviseur, f'/api/calendar/{self.controleur.id}/planning/')
+        self.assert_no_full_scan(self.superviseur, f'/api/calendar/{self.controleur.id}/documents/?date={planif.date}')
+
+
+@override_settings(CALENDAR_CACHE_TIMEOUT=0)  # requêtes réellement exécutées, sans cache de réponses
+class PlanificationQueryCountTests(TestCase):
+    def setUp(self):
+        self.centre = Centre.objects.create(nom="Centre")
+        self.superviseur = CustomUser.objects.create_user("s@test.fr", "pw", role='superviseur', centre=self.centre)
+        self.controleur = CustomUser.objects.create_user("c@test.fr", "pw", role='controleur', centre=self.centre)
+        self.client = APIClient()
+
+    def planifier(self, nombre):
+        employeurs = Employeur.objects.bulk_create([
+            Employeur(nom=f"E{Employeur.objects.count() + i}", adresse="a", ville="v", centre=self.centre, telephone="1")
+            for i in range(nombre)
+        ])
+        Planification.objects.bulk_create([
+            Planification(controleur=self.controleur, employeur=e, date=date(2025, 1, 1 + i)) for i, e in enumerate(employeurs)
+        ])
+
+    def count_queries(self, user, url):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count_does_not_depend_on_row_count(self):
+        urls = [
+            (self.controleur, '/api/planifications/'),
+            (self.controleur, '/api/planifications/?flat=1'),
+            (self.superviseur, f'/api/calendar/{self.controleur.id}/planning/'),
+            (self.superviseur, f'/api/calendar/{self.controleur.id}/planning/?flat=1'),
+        ]
+        self.planifier(2)
+        avant = [self.count_queries(user, url) for user, url in urls]
+        self.planifier(20)
+        self.assertEqual([self.count_queries(user, url) for user, url in urls], avant)
+        self.assertEqual(avant[0], 2)  # version du calendrier (ETag) + planifications
+
+        planif = Planification.objects.first()
+        self.client.force_authenticate(self.controleur)
+        with self.assertNumQueries(1):
+            self.client.get(f'/api/planifications/{planif.id}/')
+
+    def test_flat_path_returns_the_same_json(self):
+        self.planifier(3)
+        self.client.force_authenticate(self.controleur)
+        complet = self.client.get('/api/planifications/').json()
+        self.assertEqual(self.client.get('/api/planifications/?flat=1').json(), complet)
+        self.assertEqual(complet[0]['controleur']['email'], "c@test.fr")
+
+
+class PlanningPaginationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        centre = Centre.objects.create(nom="Centre")
+        self.superviseur = CustomUser.objects.create_user("s@test.fr", "pw", role='superviseur', centre=centre)
+        self.controleur = CustomUser.objects.create_user("c@test.fr", "pw", role='controleur', centre=centre)
+        employeurs = Employeur.objects.bulk_create([
+            Employeur(nom=f"E{i}", adresse="a", ville="v", centre=centre, telephone="1") for i in range(10)
+        ])
+        # Deux contrôles le même jour pour départager par id
+        jours = [date(2025, 1, 6), date(2025, 1, 6), date(2025, 1, 31), date(2025, 2, 3), date(2025, 2, 28),
+                 date(2025, 3, 3), date(2025, 3, 31), date(2025, 4, 1), date(2025, 6, 2), date(2025, 6, 3)]
+        Planification.objects.bulk_create([
+            Planification(controleur=self.controleur, employeur=e, date=jour) for e, jour in zip(employeurs, jours)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.controleur)
+
+    def test_cursor_walks_every_row_in_date_order(self):
+        url, lignes = '/api/planifications/?limit=3', []
+        while url:
+            page = self.client.get(url).json()
+            self.assertLessEqual(len(page['results']), 3)
+            lignes += [(p['date'], p['id']) for p in page['results']]
+            url = page['next']
+        attendu = Planification.objects.order_by('date', 'id').values_list('date', 'id')
+        self.assertEqual(lignes, [(d.isoformat(), pk) for d, pk in attendu])
+
+    def test_flat_pages_match_serializer_pages(self):
+        page = self.client.get('/api/planifications/?limit=4&from=2025-02-01').json()
+        flat = self.client.get('/api/planifications/?limit=4&from=2025-02-01&flat=1').json()
+        self.assertEqual(flat['results'], page['results'])
+        self.assertEqual(page['results'][0]['date'], '2025-02-03')
+
+    def test_date_range_and_month_window(self):
+        dates = [p['date'] for p in self.client.get('/api/planifications/?from=2025-02-01&to=2025-03-31').json()]
+        self.assertEqual(dates, ['2025-02-03', '2025-02-28', '2025-03-03', '2025-03-31'])
+
+        # Mars 2025 affiché du lundi 24 février au dimanche 6 avril
+        self.client.force_authenticate(self.superviseur)
+        url = f'/api/calendar/{self.controleur.id}/planning/?month=2025-03'
+        dates = [p['date'] for p in self.client.get(url).json()]
+        self.assertEqual(dates, ['2025-02-28', '2025-03-03', '2025-03-31', '2025-04-01'])
+
+    def test_invalid_parameters_are_rejected(self):
+        for query in ('month=2025-13', 'from=demain', 'cursor=xyz', 'limit=abc'):
+            response = self.client.get(f'/api/planifications/?{query}')
+            self.assertEqual(response.status_code, 400, query)
+
+    def test_default_response_is_unchanged(self):
+        self.assertEqual(len(self.client.get('/api/planifications/').json()), 10)
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.centre = Centre.objects.create(nom="Centre")
+        self.superviseur = CustomUser.objects.create_user("s@test.fr", "pw", role='superviseur', centre=self.centre)
+        self.controleur = CustomUser.objects.create_user("c@test.fr", "pw", role='controleur', centre=self.centre)
+        self.employeur = Employeur.objects.create(nom="E", adresse="a", ville="v", centre=self.centre, telephone="1")
+        self.planif = Planification.objects.create(controleur=self.controleur, employeur=self.employeur, date=date(2025, 3, 3))
+        self.client = APIClient()
+
+    def revalidate(self, user, url):
+        # (statut du premier GET, statut du GET conditionnel)
+        self.client.force_authenticate(user)
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code
+
+    def test_unchanged_calendar_answers_304_without_serializing(self):
+        self.client.force_authenticate(self.controleur)
+        response = self.client.get('/api/planifications/')
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/planifications/', HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.revalidate(self.superviseur, '/api/calendar/'), 304)
+        self.assertEqual(self.revalidate(self.superviseur, f'/api/calendar/{self.controleur.id}/planning/'), 304)
+
+    def test_changes_invalidate_the_etag(self):
+        url = f'/api/calendar/{self.controleur.id}/planning/'
+        self.client.force_authenticate(self.superviseur)
+        etags = {u: self.client.get(u)['ETag'] for u in ('/api/calendar/', url, url + '?flat=1')}
+        self.assertNotEqual(etags[url], etags[url + '?flat=1'])
+
+        self.planif.date = date(2025, 3, 4)
+        self.planif.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etags[url]).status_code, 200)
+        # Le nom du contrôleur apparaît dans la liste du centre
+        self.controleur.nom = "Martin"
+        self.controleur.save()
+        self.assertEqual(self.client.get('/api/calendar/', HTTP_IF_NONE_MATCH=etags['/api/calendar/']).status_code, 200)
+
+    def test_irrelevant_saves_keep_the_etag(self):
+        self.client.force_authenticate(self.superviseur)
+        etag = self.client.get('/api/calendar/')['ETag']
+        self.controleur.set_password("autre")
+        self.controleur.save()
+        self.employeur.score = 50
+        self.employeur.save()
+        self.assertEqual(self.client.get('/api/calendar/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_bulk_planification_bumps_versions(self):
+        self.client.force_authenticate(self.controleur)
+        etag = self.client.get('/api/planifications/')['ETag']
+        Employeur.objects.create(nom="E2", adresse="a", ville="v", centre=self.centre, telephone="1")
+        call_command('planification', seed=1, stdout=io.StringIO())
+        self.assertEqual(self.client.get('/api/planifications/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CalendarCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.centre = Centre.objects.create(nom="Centre")
+        self.autre_centre = Centre.objects.create(nom="Autre")
+        self.superviseur = CustomUser.objects.create_user("s@test.fr", "pw", role='superviseur', centre=self.centre)
+        self.controleur = CustomUser.objects.create_user("c@test.fr", "pw", role='controleur', centre=self.centre)
+        self.autre = CustomUser.objects.create_user("a@test.fr", "pw", role='controleur', centre=self.autre_centre)
+        self.client = APIClient()
+        self.client.force_authenticate(self.superviseur)
+
+    def test_controller_list_is_served_from_cache_until_a_controller_changes(self):
+        self.client.get('/api/calendar/')
+        with self.assertNumQueries(1):  # version pour l'ETag uniquement
+            self.assertEqual(len(self.client.get('/api/calendar/').json()), 1)
+
+        CustomUser.objects.create_user("c2@test.fr", "pw", role='controleur', centre=self.centre)
+        self.assertEqual(len(self.client.get('/api/calendar/').json()), 2)
+
+    def test_holidays_are_invalidated_by_leave_days_and_public_holidays(self):
+        url = '/api/calendar/holidays/?year=2025'
+        self.assertEqual(self.client.get(url).json(), {'jours_feries': [], 'conges': []})
+        with self.assertNumQueries(1):  # versions uniquement
+            self.client.get(url)
+
+        JourFerie.objects.create(nom="Fête", date=date(2025, 5, 20))
+        conge = JourConge.objects.create(controleur=self.controleur, date=date(2025, 8, 4))
+        data = self.client.get(url).json()
+        self.assertEqual(data['jours_feries'], [{'date': '2025-05-20', 'nom': "Fête"}])
+        self.assertEqual(data['conges'], [{'controleur': self.controleur.id, 'date': '2025-08-04'}])
+
+        # Les congés d'un autre centre n'invalident pas ce centre
+        JourConge.objects.create(controleur=self.autre, date=date(2025, 8, 4))
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        conge.delete()
+        self.assertEqual(self.client.get(url).json()['conges'], [])
+
+    def test_version_bumped_elsewhere_is_never_served_stale(self):
+        # Modification faite par un autre processus : seule la version en base change,
+        # le cache local de ce processus n'est pas prévenu
+        employeur = Employeur.objects.create(nom="E", adresse="a", ville="v", centre=self.centre, telephone="1")
+        url = f'/api/calendar/{self.controleur.id}/planning/'
+        etag = self.client.get(url)['ETag']
+
+        Planification.objects.bulk_create([Planification(controleur=self.controleur, employeur=employeur, date=date(2025, 3, 3))])
+        PlanningVersion.objects.update_or_create(scope='controleur', object_id=self.controleur.id, defaults={'version': 99})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_planning_cache_follows_planifications_and_reports_hit_ratio(self):
+        employeur = Employeur.objects.create(nom="E", adresse="a", ville="v", centre=self.centre, telephone="1")
+        url = f'/api/calendar/{self.controleur.id}/planning/'
+        with mock.patch.object(metrics, 'incr') as incr:
+            self.assertEqual(self.client.get(url).json(), [])
+            Planification.objects.create(controleur=self.controleur, employeur=employeur, date=date(2025, 3, 3))
+            self.assertEqual(len(self.client.get(url).json()), 1)
+            self.client.get(url)
+        self.assertEqual([c.args[0] for c in incr.call_args_list],
+                         ['calendar_cache.misses', 'calendar_cache.misses', 'calendar_cache.hits'])
+
+        admin = CustomUser.objects.create_superuser("admin@test.fr", "pw")
+        self.client.force_authenticate(admin)
+        self.assertIn('calendar_cache', self.client.get('/api/ops/metrics/').json())
+
+
+class DashboardTests(TestCase):
+    def setUp(self):
+        centre = Centre.objects.create(nom="Centre")
+        autre = Centre.objects.create(nom="Autre")
+        self.superviseur = CustomUser.objects.create_user("s@test.fr", "pw", role='superviseur', centre=centre)
+        self.actif = CustomUser.objects.create_user("a@test.fr", "pw", role='controleur', centre=centre, nom="A")
+        self.inactif = CustomUser.objects.create_user("b@test.fr", "pw", role='controleur', centre=centre, nom="B")
+        ailleurs = CustomUser.objects.create_user("x@test.fr", "pw", role='controleur', centre=autre)
+        employeurs = Employeur.objects.bulk_create([
+            Employeur(nom=f"E{i}", adresse="a", ville="v", centre=centre, telephone="1") for i in range(5)
+        ])
+        jours = [date(2025, 1, 6), date(2025, 1, 13), date(2025, 3, 3), date(2024, 12, 2)]
+        planifs = Planification.objects.bulk_create([
+            Planification(controleur=self.actif, employeur=e, date=jour) for e, jour in zip(employeurs, jours)
+        ])
+        Planification.objects.create(controleur=ailleurs, employeur=employeurs[4], date=date(2025, 1, 6))
+        # Janvier : un contrôle avec deux documents et son rapport, un avec un document sans rapport
+        Document.objects.bulk_create([
+            Document(planification=planifs[0], url="https://example.com/1.pdf"),
+            Document(planification=planifs[0], url="https://example.com/2.pdf"),
+            Document(planification=planifs[1], url="https://example.com/3.pdf"),
+        ])
+        SummaryReport.objects.create(planification=planifs[0], report_url="https://example.com/r.pdf")
+        # Analyses : la première a réussi, la seconde a échoué puis a été relancée et échoué à nouveau
+        AnalysisJob.objects.create(planification=planifs[0], status='done')
+        AnalysisJob.objects.create(planification=planifs[1], status='running')
+        AnalysisJob.objects.create(planification=planifs[1], status='failed')
+        self.client = APIClient()
+        self.client.force_authenticate(self.superviseur)
+
+    def test_aggregates_per_controller_and_month_with_grouped_queries(self):
+        with self.assertNumQueries(2):  # contrôles et état des analyses
+            data = self.client.get('/api/calendar/dashboard/?year=2025').json()
+
+        self.assertEqual(data['year'], 2025)
+        actif, inactif = data['controleurs']
+        self.assertEqual((actif['id'], inactif['id']), (self.actif.id, self.inactif.id))
+        self.assertEqual(
+            {k: actif[k] for k in ('total', 'avec_documents', 'sans_documents', 'avec_rapport', 'rapport_en_attente')},
+            {'total': 3, 'avec_documents': 2, 'sans_documents': 1, 'avec_rapport': 1, 'rapport_en_attente': 1},
+        )
+        # Seule la dernière analyse de chaque contrôle compte
+        self.assertEqual(
+            {k: actif[k] for k in ('analyse_en_attente', 'analyse_en_cours', 'analyse_echouee')},
+            {'analyse_en_attente': 0, 'analyse_en_cours': 0, 'analyse_echouee': 1},
+        )
+        self.assertEqual(actif['par_mois'], [
+            {'mois': '2025-01', 'total': 2, 'avec_documents': 2, 'sans_documents': 0, 'avec_rapport': 1, 'rapport_en_attente': 1,
+             'analyse_en_attente': 0, 'analyse_en_cours': 0, 'analyse_echouee': 1},
+            {'mois': '2025-03', 'total': 1, 'avec_documents': 0, 'sans_documents': 1, 'avec_rapport': 0, 'rapport_en_attente': 0,
+             'analyse_en_attente': 0, 'analyse_en_cours': 0, 'analyse_echouee': 0},
+        ])
+        self.assertEqual((inactif['total'], inactif['par_mois']), (0, []))
+
+    def test_only_supervisors_have_access(self):
+        self.client.force_authenticate(self.actif)
+        self.assertEqual(self.client.get('/api/calendar/dashboard/').status_code, 403)
+
+
+class ImportEmployeursTests(TestCase):
+    def write_csv(self, content):
+        fd, path = tempfile.mkstemp(suffix='.csv')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_rows_inserted_elsewhere_are_not_counted_as_created(self):
+        centre = Centre.objects.create(nom="Centre")
+        preload = EmployeurImporter.preload
+
+        def preload_puis_insertion_concurrente(importer):
+            preload(importer)
+            Employeur.objects.create(nom="Concurrent", adresse="a", ville="v", centre=centre, telephone="1", score=1)
+
+        path = self.write_csv(
+            "nom,adresse,ville,telephone,centre,score\n"
+            "Concurrent,a,v,1,Centre,5\n"
+            "Nouveau,a,v,1,Centre,7\n"
+        )
+        self.addCleanup(lambda: os.path.exists(path + ".rejets.csv") and os.remove(path + ".rejets.csv"))
+        out = io.StringIO()
+        with mock.patch.object(EmployeurImporter, 'preload', preload_puis_insertion_concurrente):
+            call_command('import_employeurs', path, stdout=out)
+
+        self.assertEqual(Employeur.objects.count(), 2)
+        self.assertIn("1 employeur(s) importé(s)", out.getvalue())
+        self.assertIn("1 ligne(s) ignorée(s)", out.getvalue())
+
+    def test_bulk_import_skips_duplicates_and_reports_bad_rows(self):
+        centre = Centre.objects.create(nom="Centre")
+        Employeur.objects.create(nom="Existant", adresse="a", ville="v", centre=centre, telephone="1", score=1)
+        path = self.write_csv(
+            "nom,adresse,ville,telephone,centre,score\n"
+            "Existant,a,v,1,Centre,5\n"
+            "Nouveau,a,v,1,Centre,7\n"
+            "Nouveau,a,v,1,Centre,7\n"
+            "Autre,a,v,1,Inconnu,3\n"
+            "Invalide,a,v,1,Centre,abc\n"
+        )
+        rejets = path + ".rejets.csv"
+        self.addCleanup(lambda: os.path.exists(rejets) and os.remove(rejets))
+        out = io.StringIO()
+        call_command('import_employeurs', path, batch_size=2, stdout=out)
+
+        self.assertEqual(sorted(Employeur.objects.values_list('nom', flat=True)), ["Existant", "Nouveau"])
+        self.assertIn("1 employeur(s) importé(s)", out.getvalue())
+        self.assertIn("3 ligne(s) ignorée(s)", out.getvalue())
+        with open(rejets, encoding='utf-8') as f:
+            lignes = list(csv.reader(f))
+        self.assertEqual(lignes[0][:3], ['ligne', 'erreur', 'nom'])
+        self.assertEqual([ligne[0] for ligne in lignes[1:]], ['6'])
+
+    def test_upsert_updates_changed_rows_only(self):
+        centre = Centre.objects.create(nom="Centre")
+        Employeur.objects.create(nom="Stable", adresse="a", ville="v", centre=centre, telephone="1", score=10)
+        Employeur.objects.create(nom="Risque", adresse="a", ville="v", centre=centre, telephone="1", score=10)
+        path = self.write_csv(
+            "nom,adresse,ville,telephone,centre,score\n"
+            "Stable,a,v,1,Centre,10\n"
+            "Risque,a,v,1,Centre,90\n"
+            "Nouveau,a,v,1,Centre,50\n"
+        )
+        out = io.StringIO()
+        call_command('import_employeurs', path, upsert=True, stdout=out)
+
+        self.assertEqual(dict(Employeur.objects.values_list('nom', 'score')), {"Stable": 10, "Risque": 90, "Nouveau": 50})
+        self.assertIn("1 inséré(s), 1 mis à jour, 1 inchangé(s)", out.getvalue())
+
+    def test_resume_skips_rows_before_checkpoint(self):
+        centre = Centre.objects.create(nom="Centre")
+        path = self.write_csv(
+            "nom,adresse,ville,telephone,centre,score\n"
+            "Premier,a,v,1,Centre,5\n"
+            "Second,a,v,1,Centre,7\n"
+        )
+        self.addCleanup(lambda: os.path.exists(path + ".checkpoint") and os.remove(path + ".checkpoint"))
+        # Simule un import interrompu après la ligne 2 (dont la ligne aurait été supprimée depuis)
+        importing.Checkpoint(path + ".checkpoint", path).save(2)
+
+        call_command('import_employeurs', path, resume=True, stdout=io.StringIO())
+
+        self.assertEqual(list(Employeur.objects.filter(centre=centre).values_list('nom', flat=True)), ["Second"])
+        self.assertFalse(os.path.exists(path + ".checkpoint"))
+
+    def test_gzip_and_xlsx_sources(self):
+        import gzip
+        import openpyxl
+
+        Centre.objects.create(nom="Centre")
+        fd, gz_path = tempfile.mkstemp(suffix='.csv.gz')
+        os.close(fd)
+        self.addCleanup(os.remove, gz_path)
+        with gzip.open(gz_path, 'wt', encoding='utf-8') as f:
+            f.write("nom,adresse,ville,telephone,centre,score\nGzip,a,v,1,Centre,5\n")
+
+        fd, xlsx_path = tempfile.mkstemp(suffix='.xlsx')
+        os.close(fd)
+        self.addCleanup(os.remove, xlsx_path)
+        workbook = openpyxl.Workbook()
+        workbook.active.append(["nom", "adresse", "ville", "telephone", "centre", "score"])
+        workbook.active.append(["Excel", "a", "v", 600000000, "Centre", 12.0])
+        workbook.save(xlsx_path)
+
+        call_command('import_employeurs', gz_path, stdout=io.StringIO())
+        call_command('import_employeurs', xlsx_path, stdout=io.StringIO())
+
+        self.assertEqual(sorted(Employeur.objects.values_list('nom', 'score', 'telephone')),
+                         [("Excel", 12, "600000000"), ("Gzip", 5, "1")])
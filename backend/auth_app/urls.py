@@ -1,7 +1,7 @@
 # authapp/urls.py
 
 from django.urls import path
-from .views import RegisterView, LoginView, MeView, PlanificationListView, DocumentUploadView, PlanificationDetailView, ControleurListView, PlanningListView, DocumentListView, DocumentDownloadView, SummaryReportDownloadView
+from .views import RegisterView, LoginView, MeView, PlanificationListView, DocumentUploadView, PlanificationDetailView, ControleurListView, PlanningListView, DocumentListView, DocumentDownloadView, SummaryReportDownloadView, AnalysisStatusView, DocumentPresignView, DocumentUploadCompleteView, OpsMetricsView, HolidayListView, DashboardView
 
 urlpatterns = [
     path('register/', RegisterView.as_view(), name='register'),
@@ -9,11 +9,17 @@ urlpatterns = [
     path('me/', MeView.as_view(), name='me'),
     path('planifications/', PlanificationListView.as_view(), name='planifications'),
     path('upload-documents/', DocumentUploadView.as_view(), name='upload-documents'),
+    path('upload-documents/presign/', DocumentPresignView.as_view(), name='upload-documents-presign'),
+    path('upload-documents/complete/', DocumentUploadCompleteView.as_view(), name='upload-documents-complete'),
     path('planifications/<int:pk>/', PlanificationDetailView.as_view(), name='planification-detail'),
+    path('planifications/<int:pk>/analysis/', AnalysisStatusView.as_view(), name='planification-analysis-status'),
     path('calendar/', ControleurListView.as_view(), name='controleur-list'),
+    path('calendar/dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('calendar/holidays/', HolidayListView.as_view(), name='holiday-list'),
     path('calendar/<int:controleur_id>/planning/', PlanningListView.as_view(), name='planning-list'),
     path('calendar/<int:controleur_id>/documents/', DocumentListView.as_view(), name='document-list'),
     path('documents/<int:document_id>/download/', DocumentDownloadView.as_view(), name='document-download'),
     path('summary-reports/<int:report_id>/download/', SummaryReportDownloadView.as_view(), name='summary-report-download'),
+    path('ops/metrics/', OpsMetricsView.as_view(), name='ops-metrics'),
 ]
 
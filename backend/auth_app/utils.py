@@ -1,43 +1,45 @@
 # auth_app/utils.py
 
-import boto3
-from django.conf import settings
 from io import BytesIO
+import hashlib
 import PyPDF2
-import openai
 import logging
-import os
 from reportlab.lib.pagesizes import letter
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
 from reportlab.lib.styles import getSampleStyleSheet
 import json
+from . import s3
+from .analysis import analyze_documents
 
 logger = logging.getLogger(__name__)
-def extract_text_from_s3_url(file_url):
-    try:
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME
-        )
-        url_parts = file_url.replace(f"https://{settings.AWS_STORAGE_BUCKET_NAME}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/", "").split("/")
-        bucket_name = settings.AWS_STORAGE_BUCKET_NAME
-        file_key = "/".join(url_parts)
 
-        file_object = BytesIO()
-        s3_client.download_fileobj(bucket_name, file_key, file_object)
-        file_object.seek(0)
 
-        pdf_reader = PyPDF2.PdfReader(file_object)
+def extract_text_from_fileobj(file_object):
+    """Retourne (texte, nombre de pages, SHA-256 du contenu) pour un fichier PDF ouvert."""
+    content = file_object.read()
+    content_hash = hashlib.sha256(content).hexdigest()
+
+    try:
+        pdf_reader = PyPDF2.PdfReader(BytesIO(content))
+        page_count = len(pdf_reader.pages)
         text = ""
         for page in pdf_reader.pages:
             page_text = page.extract_text()
             if page_text:
                 text += page_text + "\n"
-        
+    except Exception as e:
+        # Fichier illisible (image, PDF corrompu...) : inutile de réessayer
+        logger.warning(f"Impossible de lire le PDF: {str(e)}")
+        return "", 0, content_hash
+
+    return text.strip(), page_count, content_hash
+
+
+def extract_text_from_s3_url(file_url):
+    try:
+        extracted_text, _, _ = extract_text_from_fileobj(s3.get_object(s3.key_from_url(file_url))['Body'])
+
         # Validation du texte extrait
-        extracted_text = text.strip()
         if not extracted_text:
             logger.warning(f"Aucun texte extrait du fichier {file_url}")
         else:
@@ -48,34 +50,6 @@ def extract_text_from_s3_url(file_url):
         logger.error(f"Erreur lors de l'extraction du texte depuis {file_url}: {str(e)}", exc_info=True)
         return ""
 
-def segment_text(text, max_tokens=2500):  # Réduit pour laisser de la place au prompt
-    if not text or not text.strip():
-        return []
-    
-    words = text.split()
-    if not words:
-        return []
-    
-    segments = []
-    current_segment = []
-    current_length = 0
-
-    for word in words:
-        word_length = len(word) + 1
-        if current_length + word_length > max_tokens and current_segment:
-            segments.append(" ".join(current_segment))
-            current_segment = [word]
-            current_length = word_length
-        else:
-            current_segment.append(word)
-            current_length += word_length
-    
-    if current_segment:
-        segments.append(" ".join(current_segment))
-    
-    logger.info(f"Texte segmenté en {len(segments)} segments")
-    return segments
-
 def analyze_documents_with_openai(texts):
     try:
         # Validation des textes d'entrée
@@ -86,98 +60,18 @@ def analyze_documents_with_openai(texts):
         # Filtrer les textes vides
         valid_texts = [text for text in texts if text and text.strip()]
         logger.info(f"Analyse de {len(valid_texts)} documents valides")
-        
-        # Segmentation des textes
-        segmented_texts = []
-        for i, text in enumerate(valid_texts):
-            segments = segment_text(text)
-            if segments:
-                segmented_texts.extend(segments)
-                logger.info(f"Document {i+1}: {len(segments)} segments créés")
-            else:
-                logger.warning(f"Document {i+1}: aucun segment créé")
-        
-        if not segmented_texts:
-            logger.error("Aucun segment de texte créé")
-            return {"summaries": [], "convergences": [], "divergences": [], "error": "Aucun segment de texte à analyser"}
 
-        # Construction du prompt amélioré
-        prompt = (
-            "Tu es un expert comptable qui analyse des documents financiers. "
-            "Analyse les textes suivants extraits de documents financiers et produis une analyse structurée.\n\n"
-            "IMPORTANT: Ta réponse doit être un JSON valide avec cette structure exacte:\n"
-            "{\n"
-            '  "summaries": ["résumé 1", "résumé 2", ...],\n'
-            '  "convergences": ["point commun 1", "point commun 2", ...],\n'
-            '  "divergences": ["différence 1", "différence 2", ...]\n'
-            "}\n\n"
-            "Pour chaque segment, identifie:\n"
-            "- Les chiffres clés (CA, bénéfices, pertes, ratios)\n"
-            "- Les anomalies ou points d'attention\n"
-            "- Les tendances financières\n\n"
-            "Puis compare tous les segments pour identifier convergences et divergences.\n\n"
-            "Textes à analyser:\n"
-        )
-        
-        for idx, text in enumerate(segmented_texts, 1):
-            # Limiter la taille de chaque segment dans le prompt
-            text_preview = text[:1000] if len(text) > 1000 else text
-            prompt += f"=== SEGMENT {idx} ===\n{text_preview}\n\n"
+        # Map-reduce : chaque segment est résumé en entier, puis les documents sont comparés
+        return analyze_documents(valid_texts)
 
-        logger.info(f"Envoi de la requête à OpenAI avec {len(segmented_texts)} segments")
-        
-        # Configuration OpenAI mise à jour
-        client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
-        
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo-1106",  # Version plus récente
-            messages=[
-                {
-                    "role": "system", 
-                    "content": "Tu es un expert comptable. Réponds uniquement en JSON valide selon le format demandé."
-                },
-                {
-                    "role": "user", 
-                    "content": prompt
-                }
-            ],
-            max_tokens=2000,
-            temperature=0.2,  # Plus déterministe
-            response_format={"type": "json_object"}  # Force la réponse JSON
-        )
-        
-        analysis_text = response.choices[0].message.content
-        logger.info(f"Réponse reçue d'OpenAI: {len(analysis_text)} caractères")
-        
-        # Debug: afficher la réponse brute
-        logger.debug(f"Réponse OpenAI brute: {analysis_text}")
-        
-        try:
-            analysis = json.loads(analysis_text)
-            
-            # Validation de la structure
-            required_keys = ['summaries', 'convergences', 'divergences']
-            for key in required_keys:
-                if key not in analysis:
-                    analysis[key] = []
-                elif not isinstance(analysis[key], list):
-                    analysis[key] = [str(analysis[key])]
-            
-            logger.info(f"Analyse réussie: {len(analysis['summaries'])} résumés, "
-                       f"{len(analysis['convergences'])} convergences, "
-                       f"{len(analysis['divergences'])} divergences")
-            
-            return analysis
-            
-        except json.JSONDecodeError as je:
-            logger.error(f"Erreur de parsing JSON: {str(je)}")
-            logger.error(f"Contenu reçu: {analysis_text}")
-            return {
-                "summaries": [f"Erreur d'analyse: réponse invalide"],
-                "convergences": [], 
-                "divergences": [],
-                "error": f"Erreur JSON: {str(je)}"
-            }
+    except json.JSONDecodeError as je:
+        logger.error(f"Erreur de parsing JSON: {str(je)}")
+        return {
+            "summaries": [f"Erreur d'analyse: réponse invalide"],
+            "convergences": [], 
+            "divergences": [],
+            "error": f"Erreur JSON: {str(je)}"
+        }
             
     except Exception as e:
         logger.error(f"Erreur lors de l'analyse avec OpenAI : {str(e)}", exc_info=True)
@@ -284,13 +178,6 @@ def debug_document_analysis(file_urls):
 
 
 def upload_report_to_s3(file_path, planification_id):
-    s3_client = boto3.client(
-        's3',
-        aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-        aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-        region_name=settings.AWS_S3_REGION_NAME
-    )
     report_name = f"reports/planification-{planification_id}/summary_report.pdf"
     with open(file_path, 'rb') as f:
-        s3_client.upload_fileobj(f, settings.AWS_STORAGE_BUCKET_NAME, report_name, ExtraArgs={'ContentType': 'application/pdf'})
-    return f"https://{settings.AWS_STORAGE_BUCKET_NAME}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/{report_name}"
\ No newline at end of file
+        return s3.upload_fileobj(f, report_name, content_type='application/pdf')
@@ -0,0 +1,90 @@
+# auth_app/versions.py
+
+"""Compteurs de version des données calendrier, pour les GET conditionnels et le cache.
+
+Chaque contrôleur a une version de ses plannings, chaque centre une version de sa
+liste de contrôleurs et de ses congés, et les jours fériés une version commune.
+Les signaux (auth_app/signals.py) les incrémentent à chaque modification ; les
+opérations en masse (bulk_create / bulk_update) ne déclenchent pas de signal et
+appellent bump() ou bump_controleurs() explicitement. Un endpoint compare l'ETag
+dérivé de la version avec If-None-Match et répond 304 sans rien sérialiser.
+Les versions étant en base, elles sont les mêmes pour tous les processus.
+"""
+
+import hashlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+from .models import CustomUser, PlanningVersion
+
+CONTROLEUR = 'controleur'  # plannings d'un contrôleur
+CENTRE = 'centre'          # liste des contrôleurs d'un centre
+CONGES = 'conges'          # congés des contrôleurs d'un centre
+FERIES = 'feries'          # jours fériés, communs à tous les centres (identifiant TOUS)
+TOUS = 0
+
+
+def bump(scope, ids):
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return
+    now = timezone.now()
+    existants = set(PlanningVersion.objects.filter(scope=scope, object_id__in=ids).values_list('object_id', flat=True))
+    PlanningVersion.objects.filter(scope=scope, object_id__in=existants).update(version=F('version') + 1, updated_at=now)
+    for object_id in ids - existants:
+        try:
+            with transaction.atomic():
+                PlanningVersion.objects.create(scope=scope, object_id=object_id, version=1, updated_at=now)
+        except IntegrityError:
+            # Créé entre-temps par un autre processus
+            PlanningVersion.objects.filter(scope=scope, object_id=object_id).update(version=F('version') + 1, updated_at=now)
+
+
+def bump_controleurs(controleur_ids, centre_ids=()):
+    # Plannings des contrôleurs et listes des centres qui les affichent
+    controleur_ids = set(controleur_ids)
+    centres = set(centre_ids) | set(CustomUser.objects.filter(id__in=controleur_ids).values_list('centre_id', flat=True))
+    bump(CONTROLEUR, controleur_ids)
+    bump(CENTRE, centres)
+
+
+def current(scope, object_id):
+    # (version, date de dernière modification) ; (0, None) si jamais modifié depuis le suivi
+    return PlanningVersion.objects.filter(scope=scope, object_id=object_id).values_list(
+        'version', 'updated_at'
+    ).first() or (0, None)
+
+
+def current_many(scopes):
+    # [(scope, object_id, version)] en une requête ; version 0 si jamais modifié
+    condition = Q()
+    for scope, object_id in scopes:
+        condition |= Q(scope=scope, object_id=object_id)
+    found = {
+        (scope, object_id): version
+        for scope, object_id, version in PlanningVersion.objects.filter(condition).values_list('scope', 'object_id', 'version')
+    }
+    return [(scope, object_id, found.get((scope, object_id), 0)) for scope, object_id in scopes]
+
+
+def conditional_get(request, scope, object_id, build_response):
+    """Répond 304 si If-None-Match / If-Modified-Since correspondent à la version courante,
+    sinon appelle build_response(version) et ajoute ETag et Last-Modified à la réponse."""
+    version, updated_at = current(scope, object_id)
+    # La requête complète fait partie de l'ETag : filtres, pagination et ?flat= donnent des corps différents
+    etag = quote_etag(hashlib.sha1(f"{request.get_full_path()}|{scope}:{object_id}:{version}".encode()).hexdigest())
+    last_modified = int(updated_at.timestamp()) if updated_at else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = build_response(version)
+        if response.status_code != 200:
+            return response
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified)
+    return response
@@ -1,21 +1,28 @@
 from rest_framework import status,generics
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.permissions import AllowAny, IsAuthenticated
-from .models import CustomUser, Planification, Document, SummaryReport
+from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
+from rest_framework.utils.urls import replace_query_param
+from .models import CustomUser, Planification, Document, SummaryReport, AnalysisJob, AnalysisCacheEntry, JourConge, JourFerie
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
-from .serializers import RegisterSerializer, PlanificationSerializer, CustomUserSerializer, DocumentSerializer
+from .serializers import RegisterSerializer, PlanificationSerializer, CustomUserSerializer, DocumentSerializer, planification_queryset, planifications_flat
 from rest_framework.parsers import MultiPartParser, FormParser
 from django.conf import settings
+from django.db.models import Count, FilteredRelation, OuterRef, Q, Subquery
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
 from .permissions import IsSuperviseur
 from django.shortcuts import get_object_or_404
-import boto3
 import logging
-import os
-from .utils import extract_text_from_s3_url, analyze_documents_with_openai, generate_summary_report, upload_report_to_s3
-from django.http import FileResponse
-import requests
+from . import calendar_cache, metrics, pagination, versions
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from . import s3
+from .tasks import register_documents
+from .utils import extract_text_from_fileobj
+from django.http import FileResponse, HttpResponseNotModified, HttpResponseRedirect
+from botocore.exceptions import BotoCoreError, ClientError
 
 
 class RegisterView(APIView):
@@ -94,13 +101,63 @@ class PlanificationListView(APIView):
             return Response({"detail": "Vous n'êtes pas un contrôleur."}, status=403)
 
         planifications = Planification.objects.filter(controleur=user)
-        serializer = PlanificationSerializer(planifications, many=True)
-        return Response(serializer.data)
+        return versions.conditional_get(request, versions.CONTROLEUR, user.id, lambda version: calendar_cache.cached_response(
+            request, [(versions.CONTROLEUR, user.id, version)], lambda: planifications_response(request, planifications)
+        ))
+
+
+def serialize_planifications(request, planifications):
+    # ?flat=1 : chemin rapide par values_list pour les écrans calendrier (même JSON)
+    if request.query_params.get('flat') in ('1', 'true'):
+        return planifications_flat(planifications)
+    return PlanificationSerializer(planification_queryset(planifications), many=True).data
+
+
+def planifications_response(request, planifications):
+    # ?from=/?to= ou ?month= filtrent en SQL ; ?limit=/?cursor= renvoient une page {results, next}
+    params = request.query_params
+    try:
+        planifications = pagination.filter_planifications(planifications, params)
+        if not pagination.is_paginated(params):
+            return Response(serialize_planifications(request, planifications))
+        limit = pagination.page_size(params)
+    except ValueError as e:
+        return Response({"detail": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+    # Une ligne de plus pour savoir s'il reste une page
+    results = serialize_planifications(request, planifications[:limit + 1])
+    next_url = None
+    if len(results) > limit:
+        results = results[:limit]
+        cursor = pagination.encode_cursor(results[-1]['date'], results[-1]['id'])
+        next_url = replace_query_param(request.build_absolute_uri(), 'cursor', cursor)
+    return Response({'results': results, 'next': next_url})
 
 logger = logging.getLogger(__name__)
 
 
 
+def upload_document_file(file, file_name):
+    # Gros fichier : upload multipart sans attendre l'extraction, faite par le worker depuis S3
+    if file.size > settings.DOCUMENT_INLINE_EXTRACT_MAX_SIZE:
+        return s3.upload_fileobj(file, file_name, content_type=file.content_type), None
+
+    # Petit fichier : texte extrait depuis le fichier reçu plutôt que retéléchargé depuis S3
+    extracted = None
+    try:
+        extracted = extract_text_from_fileobj(file)
+    except Exception as e:
+        # Le worker retombera sur un téléchargement S3 pour ce document
+        logger.warning(f"Extraction immédiate impossible pour {file.name}: {str(e)}")
+    file.seek(0)
+
+    # ETag renvoyé par le PUT : le worker saura si le fichier a été remplacé depuis l'extraction
+    etag = s3.put_fileobj(file, file_name, content_type=file.content_type)
+    if extracted:
+        extracted = (*extracted, etag)
+    return s3.object_url(file_name), extracted
+
+
 class DocumentUploadView(APIView):
     parser_classes = (MultiPartParser, FormParser)
 
@@ -114,95 +171,183 @@ class DocumentUploadView(APIView):
         except Planification.DoesNotExist:
             return Response({'error': 'Planification introuvable.'}, status=status.HTTP_404_NOT_FOUND)
 
-        # Configurer le client S3
-        s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.AWS_ACCESS_KEY_ID,
-            aws_secret_access_key=settings.AWS_SECRET_ACCESS_KEY,
-            region_name=settings.AWS_S3_REGION_NAME
-        )
+        files = list(request.FILES.values())
+        if not files:
+            return Response({'error': 'Aucun fichier reçu.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        uploaded_urls = []
-        
-        try:
-            for key, file in request.FILES.items():
-                # Générer un nom de fichier unique
-                file_name = f"documents/planification-{planification_id}/{file.name}"
+        # Générer un nom de fichier par document
+        file_names = [s3.document_key(planification.id, file.name) for file in files]
+
+        # Uploads en parallèle sur un pool borné
+        results = {}
+        errors = []
+        with ThreadPoolExecutor(max_workers=min(settings.DOCUMENT_UPLOAD_WORKERS, len(files))) as executor:
+            futures = {
+                executor.submit(upload_document_file, file, file_name): (file, file_name)
+                for file, file_name in zip(files, file_names)
+            }
+            for future in as_completed(futures):
+                if future.cancelled():
+                    continue
+                file, file_name = futures[future]
                 try:
-                    # Uploader le fichier dans S3
-                    s3_client.upload_fileobj(
-                        file,
-                        settings.AWS_STORAGE_BUCKET_NAME,
-                        file_name,
-                        ExtraArgs={'ContentType': file.content_type}
-                    )
-                    # Générer l'URL du fichier
-                    file_url = f"https://{settings.AWS_STORAGE_BUCKET_NAME}.s3.{settings.AWS_S3_REGION_NAME}.amazonaws.com/{file_name}"
-                    # Sauvegarder l'URL dans la base de données
-                    Document.objects.create(planification=planification, url=file_url)
-                    uploaded_urls.append(file_url)
+                    results[file_name] = future.result()
                 except Exception as e:
                     logger.error(f"Erreur lors de l'upload du fichier {file.name}: {str(e)}")
-                    return Response({'error': f"Erreur lors de l'upload: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-            # Récupérer les URLs des documents pour analyse
-            document_urls = Document.objects.filter(planification_id=planification_id).values_list('url', flat=True)
-            texts = [extract_text_from_s3_url(url) for url in document_urls if extract_text_from_s3_url(url)]
-            
-            if not texts or len(texts) < 2:
-                return Response({
-                    'message': 'Documents téléchargés avec succès, mais moins de 2 textes extraits pour comparaison.',
-                    'urls': uploaded_urls
-                }, status=status.HTTP_201_CREATED)
-
-            # Analyse avec OpenAI
-            print("Début de l'analyse avec OpenAI...")
-            analysis = analyze_documents_with_openai(texts)
-            print(f"Résultat de l'analyse : {analysis}")
-
-            # Créer le dictionnaire comparisons
-            comparisons = {
-                "between": "tous les documents",
-                "summaries": analysis.get("summaries", []),
-                "convergences": analysis.get("convergences", []),
-                "divergences": analysis.get("divergences", [])
-            }
-
-            # Générer et uploader le rapport
-            temp_report_path = f"temp_summary_{planification_id}.pdf"
-            generate_summary_report(comparisons, temp_report_path)
-            summary_url = upload_report_to_s3(temp_report_path, planification_id)
-            os.remove(temp_report_path)
-
-            # Enregistrer l'URL dans la base de données avec vérification
-            if planification:
-                SummaryReport.objects.update_or_create(
-                    planification=planification,
-                    defaults={'report_url': summary_url}
-                )
-                print(f"URL du rapport enregistrée pour la planification {planification.id}: {summary_url}")
-            else:
-                logger.warning("Planification non définie lors de l'enregistrement du rapport.")
-
-            return Response({
-                'message': 'Documents téléchargés, analysés et rapport généré avec succès.',
-                'urls': uploaded_urls,
-                'summary_report_url': summary_url
-            }, status=status.HTTP_201_CREATED)
-
+                    errors.append(str(e))
+                    # Inutile de lancer les uploads restants
+                    for pending in futures:
+                        pending.cancel()
+
+        if errors:
+            # Supprimer les fichiers déjà envoyés par cette requête (clés uniques : aucun
+            # document enregistré auparavant n'est touché)
+            self.discard_uploads(list(results))
+            return Response({'error': f"Erreur lors de l'upload: {errors[0]}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        uploads = [results[file_name] for file_name in file_names]
+        try:
+            # Un seul INSERT pour les documents, dans la même transaction que la mise en file de l'analyse
+            _, job = register_documents(planification, uploads)
         except Exception as e:
             logger.error(f"Erreur dans DocumentUploadView: {str(e)}", exc_info=True)
+            self.discard_uploads(list(results))
             return Response({'error': f"Erreur serveur: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+        # L'analyse OpenAI et le rapport sont faits par le worker (manage.py run_analysis_jobs)
+        return Response({
+            'message': 'Documents téléchargés avec succès, analyse en cours.',
+            'urls': [url for url, _ in uploads],
+            'job_id': job.id,
+            'status': job.status,
+        }, status=status.HTTP_202_ACCEPTED)
+
+    def discard_uploads(self, file_names):
+        try:
+            s3.delete_objects(file_names)
+        except Exception as e:
+            logger.error(f"Impossible de supprimer les fichiers {file_names}: {str(e)}")
+
+
+class DocumentPresignView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        planification_id = request.data.get('planification_id')
+        files = request.data.get('files')
+        if not planification_id or not isinstance(files, list) or not files:
+            return Response({'error': 'Planification ID et liste de fichiers requis.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        planification = get_object_or_404(Planification, id=planification_id, controleur=request.user)
+
+        uploads = []
+        for file in files:
+            name = file.get('name') if isinstance(file, dict) else None
+            if not name:
+                return Response({'error': 'Nom de fichier manquant.'}, status=status.HTTP_400_BAD_REQUEST)
+            content_type = file.get('content_type') or 'application/octet-stream'
+            size = file.get('size')
+            if size is not None and (not isinstance(size, int) or size > settings.DOCUMENT_MAX_UPLOAD_SIZE):
+                return Response({'error': f"Fichier trop volumineux: {name}"}, status=status.HTTP_400_BAD_REQUEST)
+            key = s3.document_key(planification.id, name)
+            # URL signée limitée à cette clé, ce type de contenu et cette taille
+            presigned = s3.presigned_post(key, content_type, settings.DOCUMENT_MAX_UPLOAD_SIZE, settings.DOCUMENT_PRESIGN_EXPIRES)
+            uploads.append({
+                'name': name,
+                'key': key,
+                'url': presigned['url'],
+                'fields': presigned['fields'],
+            })
+
+        return Response({'uploads': uploads, 'expires_in': settings.DOCUMENT_PRESIGN_EXPIRES})
+
+
+class DocumentUploadCompleteView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        planification_id = request.data.get('planification_id')
+        keys = request.data.get('keys')
+        if not planification_id or not isinstance(keys, list) or not keys:
+            return Response({'error': 'Planification ID et liste de clés requis.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        planification = get_object_or_404(Planification, id=planification_id, controleur=request.user)
+
+        for key in keys:
+            if not s3.is_document_key(planification.id, key):
+                return Response({'error': f"Clé invalide pour cette planification: {key}"}, status=status.HTTP_400_BAD_REQUEST)
+
+        urls = [s3.object_url(key) for key in dict.fromkeys(keys)]
+        existing = {
+            document.url: document
+            for document in Document.objects.filter(planification=planification, url__in=urls).select_related('extracted_text')
+        }
+
+        uploads = []
+        for url in urls:
+            etag = s3.object_etag(s3.key_from_url(url))
+            if etag is None:
+                return Response({'error': f"Fichier absent du stockage: {s3.key_from_url(url)}"}, status=status.HTTP_400_BAD_REQUEST)
+            document_text = getattr(existing.get(url), 'extracted_text', None)
+            if document_text is not None and document_text.source_etag == etag:
+                # Déjà enregistré et extrait depuis ce contenu
+                continue
+            # Nouveau document ou fichier remplacé : texte extrait par le worker depuis S3, nouvelle analyse
+            uploads.append((url, None))
+
+        if not uploads:
+            return Response({'message': 'Documents déjà enregistrés.', 'urls': urls}, status=status.HTTP_200_OK)
+
+        _, job = register_documents(planification, uploads)
+        return Response({
+            'message': 'Documents enregistrés, analyse en cours.',
+            'urls': [url for url, _ in uploads],
+            'job_id': job.id,
+            'status': job.status,
+        }, status=status.HTTP_202_ACCEPTED)
 
 
+class AnalysisStatusView(APIView):
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        user = request.user
+        planification = get_object_or_404(Planification.objects.select_related('controleur'), pk=pk)
+
+        # Le contrôleur de la planification ou un superviseur du même centre
+        if user.role == 'superviseur':
+            if planification.controleur.centre_id != user.centre_id:
+                return Response({"detail": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+        elif planification.controleur_id != user.id:
+            return Response({"detail": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
+
+        job = AnalysisJob.objects.filter(planification=planification).order_by('-created_at', '-id').first()
+        summary_report = SummaryReport.objects.filter(planification=planification).first()
+
+        report_data = None
+        if summary_report:
+            report_data = {
+                'id': summary_report.id,
+                'report_url': summary_report.report_url,
+                'created_at': summary_report.created_at
+            }
+
+        return Response({
+            'planification_id': planification.id,
+            'job_id': job.id if job else None,
+            'status': job.status if job else None,
+            'attempts': job.attempts if job else 0,
+            'last_error': job.last_error if job else '',
+            'summary_report': report_data
+        })
+
 
 class PlanificationDetailView(APIView):
     permission_classes = [IsAuthenticated]
 
     def get(self, request, pk):
         print(f"Vue PlanificationDetailView appelée pour pk={pk}")
-        planification = get_object_or_404(Planification, pk=pk, controleur=request.user)
+        planification = get_object_or_404(planification_queryset(Planification.objects), pk=pk, controleur=request.user)
         serializer = PlanificationSerializer(planification)
         print(f"Planification trouvée: {serializer.data}")
         return Response(serializer.data)
@@ -214,8 +359,10 @@ class ControleurListView(APIView):
         user = request.user
         # Liste des contrôleurs du même centre que le superviseur
         controleurs = CustomUser.objects.filter(role='controleur', centre=user.centre)
-        serializer = CustomUserSerializer(controleurs, many=True)
-        return Response(serializer.data)
+        return versions.conditional_get(request, versions.CENTRE, user.centre_id, lambda version: calendar_cache.cached_response(
+            request, [(versions.CENTRE, user.centre_id, version)],
+            lambda: Response(CustomUserSerializer(controleurs, many=True).data)
+        ))
 
 class PlanningListView(APIView):
     permission_classes = [IsAuthenticated, IsSuperviseur]
@@ -225,10 +372,115 @@ class PlanningListView(APIView):
         # Vérifier que le contrôleur appartient au même centre que le superviseur
         controleur = get_object_or_404(CustomUser, id=controleur_id, role='controleur', centre=user.centre)
         planifications = Planification.objects.filter(controleur=controleur)
-        serializer = PlanificationSerializer(planifications, many=True)
-        return Response(serializer.data)    
+        return versions.conditional_get(request, versions.CONTROLEUR, controleur.id, lambda version: calendar_cache.cached_response(
+            request, [(versions.CONTROLEUR, controleur.id, version)], lambda: planifications_response(request, planifications)
+        ))
     
 
+class HolidayListView(APIView):
+    permission_classes = [IsAuthenticated, IsSuperviseur]
+
+    def get(self, request):
+        user = request.user
+        try:
+            year = int(request.query_params.get('year') or timezone.localdate().year)
+        except ValueError:
+            return Response({"detail": "Paramètre year invalide."}, status=status.HTTP_400_BAD_REQUEST)
+
+        def build():
+            # Jours fériés de l'année et congés des contrôleurs du centre
+            feries = JourFerie.objects.filter(date__year=year).order_by('date').values('date', 'nom')
+            conges = JourConge.objects.filter(
+                controleur__centre=user.centre, controleur__role='controleur', date__year=year
+            ).order_by('date', 'controleur_id').values('controleur_id', 'date')
+            return Response({
+                'jours_feries': [{'date': f['date'].isoformat(), 'nom': f['nom']} for f in feries],
+                'conges': [{'controleur': c['controleur_id'], 'date': c['date'].isoformat()} for c in conges],
+            })
+
+        etat = versions.current_many([(versions.FERIES, versions.TOUS), (versions.CONGES, user.centre_id)])
+        return calendar_cache.cached_response(request, etat, build)
+
+
+CLES_DASHBOARD = (
+    'total', 'avec_documents', 'sans_documents', 'avec_rapport', 'rapport_en_attente',
+    'analyse_en_attente', 'analyse_en_cours', 'analyse_echouee',
+)
+
+
+class DashboardView(APIView):
+    permission_classes = [IsAuthenticated, IsSuperviseur]
+
+    def get(self, request):
+        user = request.user
+        try:
+            year = int(request.query_params.get('year') or timezone.localdate().year)
+        except ValueError:
+            return Response({"detail": "Paramètre year invalide."}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Une seule requête groupée par (contrôleur, mois) ; la jointure externe filtrée sur
+        # l'année garde les contrôleurs sans contrôle. DISTINCT car un contrôle a plusieurs documents.
+        lignes = (
+            CustomUser.objects.filter(role='controleur', centre_id=user.centre_id)
+            .annotate(planifs=FilteredRelation('planification', condition=Q(planification__date__year=year)))
+            .annotate(mois=TruncMonth('planifs__date'))
+            .values('id', 'email', 'nom', 'prenom', 'mois')
+            .annotate(
+                total=Count('planifs', distinct=True),
+                avec_documents=Count('planifs', filter=Q(planifs__documents__isnull=False), distinct=True),
+                avec_rapport=Count('planifs', filter=Q(planifs__summary_report__isnull=False), distinct=True),
+                rapport_en_attente=Count('planifs', distinct=True, filter=Q(
+                    planifs__documents__isnull=False, planifs__summary_report__isnull=True
+                )),
+            )
+            .order_by('nom', 'prenom', 'id', 'mois')
+        )
+
+        # État de la dernière analyse de chaque contrôle, groupé de la même façon : un contrôle
+        # dont l'analyse a échoué n'est pas simplement « en attente » de rapport
+        dernier_job = AnalysisJob.objects.filter(planification=OuterRef('planification')).order_by('-id').values('id')[:1]
+        analyses = defaultdict(dict)
+        for ligne in (
+            AnalysisJob.objects.filter(
+                planification__controleur__centre_id=user.centre_id, planification__date__year=year,
+                id=Subquery(dernier_job),
+            )
+            .annotate(mois=TruncMonth('planification__date'))
+            .values('planification__controleur_id', 'mois', 'status')
+            .annotate(n=Count('planification', distinct=True))
+            .order_by()
+        ):
+            analyses[(ligne['planification__controleur_id'], ligne['mois'])][ligne['status']] = ligne['n']
+
+        controleurs = {}
+        for ligne in lignes:
+            controleur = controleurs.setdefault(ligne['id'], {
+                'id': ligne['id'], 'email': ligne['email'], 'nom': ligne['nom'], 'prenom': ligne['prenom'],
+                'total': 0, 'avec_documents': 0, 'sans_documents': 0,
+                'avec_rapport': 0, 'rapport_en_attente': 0,
+                'analyse_en_attente': 0, 'analyse_en_cours': 0, 'analyse_echouee': 0, 'par_mois': [],
+            })
+            if ligne['mois'] is None:
+                continue  # aucun contrôle sur l'année
+            etats = analyses[(ligne['id'], ligne['mois'])]
+            mois = {
+                'mois': ligne['mois'].strftime('%Y-%m'),
+                'total': ligne['total'],
+                'avec_documents': ligne['avec_documents'],
+                'sans_documents': ligne['total'] - ligne['avec_documents'],
+                'avec_rapport': ligne['avec_rapport'],
+                'rapport_en_attente': ligne['rapport_en_attente'],
+                'analyse_en_attente': etats.get('pending', 0),
+                'analyse_en_cours': etats.get('running', 0),
+                'analyse_echouee': etats.get('failed', 0),
+            }
+            controleur['par_mois'].append(mois)
+            for cle in CLES_DASHBOARD:
+                controleur[cle] += mois[cle]
+
+        return Response({'year': year, 'controleurs': list(controleurs.values())})
+
+
 class DocumentListView(APIView):
     permission_classes = [IsAuthenticated, IsSuperviseur]
 
@@ -274,6 +526,50 @@ class DocumentListView(APIView):
             'summary_report': report_data
         })  
 
+def s3_download_response(request, file_url):
+    key = s3.key_from_url(file_url)
+    file_name = key.split('/')[-1]
+
+    # Mode redirect : URL signée de courte durée, le fichier ne transite pas par le worker
+    mode = request.query_params.get('mode', settings.DOCUMENT_DOWNLOAD_MODE)
+    if mode == 'redirect':
+        return HttpResponseRedirect(s3.presigned_get_url(key, file_name, settings.DOCUMENT_DOWNLOAD_URL_EXPIRES))
+
+    # Mode proxy : client S3 partagé (pool + timeouts), Range et If-None-Match transmis.
+    # S3 compare lui-même l'ETag : un rapport réécrit à la même clé n'est jamais servi en 304.
+    if_none_match = request.headers.get('If-None-Match')
+    try:
+        s3_object = s3.get_object(key, range_header=request.headers.get('Range'), if_none_match=if_none_match)
+    except ClientError as e:
+        code = e.response.get('Error', {}).get('Code')
+        if code == '304':
+            response = HttpResponseNotModified()
+            response['ETag'] = if_none_match
+            return response
+        if code in ('404', 'NoSuchKey'):
+            return Response({"detail": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+        if code == 'InvalidRange':
+            return Response({"detail": "Requested range not satisfiable"}, status=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE)
+        return Response({"detail": f"Failed to download file: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    except (BotoCoreError, ValueError) as e:
+        return Response({"detail": f"Failed to download file: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+    # Retourner le contenu du fichier en streaming
+    response = FileResponse(
+        s3_object['Body'],
+        as_attachment=True,
+        filename=file_name,
+        content_type=s3_object.get('ContentType', 'application/octet-stream'),
+        status=status.HTTP_206_PARTIAL_CONTENT if s3_object.get('ContentRange') else status.HTTP_200_OK
+    )
+    response['ETag'] = s3_object['ETag']
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Length'] = s3_object['ContentLength']
+    if s3_object.get('ContentRange'):
+        response['Content-Range'] = s3_object['ContentRange']
+    return response
+
+
 class DocumentDownloadView(APIView):
     permission_classes = [IsAuthenticated, IsSuperviseur]
 
@@ -286,21 +582,7 @@ class DocumentDownloadView(APIView):
         if controleur.centre != user.centre or controleur.role != 'controleur':
             return Response({"detail": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
 
-        # Télécharger le fichier depuis l'URL cloud
-        try:
-            response = requests.get(document.url, stream=True)
-            response.raise_for_status()
-        except requests.RequestException as e:
-            return Response({"detail": f"Failed to download document: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Retourner le contenu du fichier en streaming
-        file_name = document.url.split('/')[-1]
-        return FileResponse(
-            response.raw,
-            as_attachment=True,
-            filename=file_name,
-            content_type=response.headers.get('content-type', 'application/octet-stream')
-        )
+        return s3_download_response(request, document.url)
 
 
 class SummaryReportDownloadView(APIView):
@@ -315,18 +597,29 @@ class SummaryReportDownloadView(APIView):
         if controleur.centre != user.centre or controleur.role != 'controleur':
             return Response({"detail": "Permission denied"}, status=status.HTTP_403_FORBIDDEN)
 
-        # Télécharger le rapport depuis l'URL cloud
-        try:
-            response = requests.get(report.report_url, stream=True)
-            response.raise_for_status()
-        except requests.RequestException as e:
-            return Response({"detail": f"Failed to download report: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-
-        # Retourner le contenu du fichier en streaming
-        file_name = report.report_url.split('/')[-1]
-        return FileResponse(
-            response.raw,
-            as_attachment=True,
-            filename=file_name,
-            content_type=response.headers.get('content-type', 'application/octet-stream')
-        )        
\ No newline at end of file
+        return s3_download_response(request, report.report_url)
+
+
+class OpsMetricsView(APIView):
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        counters = metrics.snapshot()
+        hits = counters.get('analysis_cache.hits', 0)
+        misses = counters.get('analysis_cache.misses', 0)
+        calendar_hits = counters.get('calendar_cache.hits', 0)
+        calendar_misses = counters.get('calendar_cache.misses', 0)
+        return Response({
+            'counters': counters,
+            'analysis_cache': {
+                'entries': AnalysisCacheEntry.objects.count(),
+                'hits': hits,
+                'misses': misses,
+                'hit_ratio': round(hits / (hits + misses), 4) if hits + misses else None,
+            },
+            'calendar_cache': {
+                'hits': calendar_hits,
+                'misses': calendar_misses,
+                'hit_ratio': round(calendar_hits / (calendar_hits + calendar_misses), 4) if calendar_hits + calendar_misses else None,
+            }
+        })
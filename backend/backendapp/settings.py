@@ -99,10 +99,70 @@ AWS_ACCESS_KEY_ID = config('AWS_ACCESS_KEY_ID')
 AWS_SECRET_ACCESS_KEY = config('AWS_SECRET_ACCESS_KEY')
 AWS_STORAGE_BUCKET_NAME = config('AWS_STORAGE_BUCKET_NAME')
 AWS_S3_REGION_NAME = config('AWS_S3_REGION_NAME')
+AWS_S3_ENDPOINT_URL = config('AWS_S3_ENDPOINT_URL', default=None)  # ex. serveur moto local pour les benchmarks
+
+# Client S3 partagé (voir auth_app/s3.py)
+AWS_S3_MAX_POOL_CONNECTIONS = config('AWS_S3_MAX_POOL_CONNECTIONS', default=50, cast=int)
+AWS_S3_CONNECT_TIMEOUT = config('AWS_S3_CONNECT_TIMEOUT', default=5, cast=int)
+AWS_S3_READ_TIMEOUT = config('AWS_S3_READ_TIMEOUT', default=60, cast=int)
+AWS_S3_MULTIPART_THRESHOLD = config('AWS_S3_MULTIPART_THRESHOLD', default=8 * 1024 * 1024, cast=int)
+AWS_S3_MULTIPART_CHUNKSIZE = config('AWS_S3_MULTIPART_CHUNKSIZE', default=8 * 1024 * 1024, cast=int)
+AWS_S3_MAX_CONCURRENCY = config('AWS_S3_MAX_CONCURRENCY', default=10, cast=int)
+DOCUMENT_UPLOAD_WORKERS = config('DOCUMENT_UPLOAD_WORKERS', default=4, cast=int)  # uploads simultanés par requête
+DOCUMENT_PRESIGN_EXPIRES = config('DOCUMENT_PRESIGN_EXPIRES', default=900, cast=int)  # durée de validité des URLs d'upload signées (s)
+DOCUMENT_MAX_UPLOAD_SIZE = config('DOCUMENT_MAX_UPLOAD_SIZE', default=50 * 1024 * 1024, cast=int)
+# Au-delà, le texte n'est pas extrait pendant la requête d'upload mais par le worker
+DOCUMENT_INLINE_EXTRACT_MAX_SIZE = config('DOCUMENT_INLINE_EXTRACT_MAX_SIZE', default=2 * 1024 * 1024, cast=int)
+DOCUMENT_DOWNLOAD_MODE = config('DOCUMENT_DOWNLOAD_MODE', default='proxy')  # 'proxy' ou 'redirect' (URL signée, 302)
+DOCUMENT_DOWNLOAD_URL_EXPIRES = config('DOCUMENT_DOWNLOAD_URL_EXPIRES', default=60, cast=int)  # secondes
 
 DEFAULT_FILE_STORAGE = 'storages.backends.s3boto3.S3Boto3Storage'
 
 OPENAI_API_KEY = config('OPENAI_API_KEY')
+OPENAI_BASE_URL = config('OPENAI_BASE_URL', default=None)  # ex. serveur local factice pour les tests
+OPENAI_MODEL = config('OPENAI_MODEL', default='gpt-3.5-turbo-1106')
+OPENAI_TIMEOUT = config('OPENAI_TIMEOUT', default=60, cast=int)
+
+# Analyse map-reduce (voir auth_app/analysis.py), budgets exprimés en tokens
+OPENAI_CONTEXT_TOKENS = config('OPENAI_CONTEXT_TOKENS', default=16385, cast=int)
+OPENAI_SEGMENT_TOKENS = config('OPENAI_SEGMENT_TOKENS', default=3000, cast=int)
+OPENAI_MAP_MAX_TOKENS = config('OPENAI_MAP_MAX_TOKENS', default=400, cast=int)
+OPENAI_REDUCE_MAX_TOKENS = config('OPENAI_REDUCE_MAX_TOKENS', default=2000, cast=int)
+OPENAI_MAX_CONCURRENCY = config('OPENAI_MAX_CONCURRENCY', default=4, cast=int)  # appels simultanés par processus
+
+# Passerelle OpenAI (voir auth_app/llm.py)
+OPENAI_RATE_LIMIT_RPS = config('OPENAI_RATE_LIMIT_RPS', default=5, cast=float)  # 0 pour désactiver
+OPENAI_RATE_LIMIT_BURST = config('OPENAI_RATE_LIMIT_BURST', default=10, cast=int)
+OPENAI_MAX_RETRIES = config('OPENAI_MAX_RETRIES', default=5, cast=int)
+OPENAI_BACKOFF_BASE = config('OPENAI_BACKOFF_BASE', default=1.0, cast=float)  # secondes
+OPENAI_BACKOFF_MAX = config('OPENAI_BACKOFF_MAX', default=30.0, cast=float)
+
+# Cache des résumés de segments
+ANALYSIS_CACHE_MAX_ENTRIES = config('ANALYSIS_CACHE_MAX_ENTRIES', default=50000, cast=int)
+ANALYSIS_CACHE_TTL_DAYS = config('ANALYSIS_CACHE_TTL_DAYS', default=180, cast=int)
+
+# Compteurs d'exploitation (voir auth_app/metrics.py), exposés sur api/ops/metrics/
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=10, cast=int)  # secondes
+
+# Cache Django : mémoire locale par défaut ; un backend partagé (ex. django.core.cache.backends.redis.RedisCache)
+# évite de recalculer chaque réponse calendrier dans chaque processus (voir auth_app/calendar_cache.py)
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='app-control'),
+    }
+}
+CALENDAR_CACHE_TIMEOUT = config('CALENDAR_CACHE_TIMEOUT', default=300, cast=int)  # secondes, 0 pour désactiver
+
+# Pagination par curseur des plannings (?limit= / ?cursor=)
+PLANNING_PAGE_SIZE = config('PLANNING_PAGE_SIZE', default=200, cast=int)
+PLANNING_PAGE_SIZE_MAX = config('PLANNING_PAGE_SIZE_MAX', default=1000, cast=int)
+
+# File d'attente des analyses de documents (voir auth_app/tasks.py)
+ANALYSIS_JOB_MAX_ATTEMPTS = config('ANALYSIS_JOB_MAX_ATTEMPTS', default=3, cast=int)
+ANALYSIS_JOB_RETRY_DELAY = config('ANALYSIS_JOB_RETRY_DELAY', default=30, cast=int)  # secondes, doublé à chaque échec
+ANALYSIS_JOB_LOCK_TIMEOUT = config('ANALYSIS_JOB_LOCK_TIMEOUT', default=600, cast=int)  # secondes avant de reprendre un job bloqué
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 